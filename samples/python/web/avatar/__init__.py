@@ -0,0 +1 @@
+"""Avatar sample: Flask app, MCP clinical assistant client, config and servers"""
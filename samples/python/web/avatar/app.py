@@ -17,6 +17,8 @@ import time
 import torch
 import traceback
 import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
 from flask import Flask, Response, render_template, request
 from flask_socketio import SocketIO, join_room
 from azure.identity import DefaultAzureCredential
@@ -65,9 +67,44 @@ enable_quick_reply = False  # Enable quick reply for certain chat models which t
 quick_replies = ['Let me take a look.', 'Let me check.', 'One moment, please.']  # Quick reply reponses
 oyd_doc_regex = re.compile(r'\[doc(\d+)\]')  # Regex to match the OYD (on-your-data) document reference
 repeat_speaking_sentence_after_reconnection = True  # Repeat the speaking sentence after reconnection
+chat_response_batch_size = 1024  # Max characters coalesced into one websocket chat response frame
+chat_response_batch_interval_ms = 50  # Max time a chat response chunk is held back before being flushed to the client
+
+
+# Per-client state, kept as a slotted dataclass so hot paths use attribute access instead of dict lookups
+@dataclass(slots=True)
+class ClientContext:
+    audio_input_stream: speechsdk.audio.PushAudioInputStream = None  # Audio input stream for speech recognition
+    vad_audio_buffer: list = field(default_factory=list)  # Audio input buffer for VAD
+    speech_recognizer: speechsdk.SpeechRecognizer = None  # Speech recognizer for user speech
+    azure_openai_deployment_name: str = azure_openai_deployment_name  # Azure OpenAI deployment name
+    cognitive_search_index_name: str = cognitive_search_index_name  # Cognitive search index name
+    tts_voice: str = default_tts_voice  # TTS voice
+    custom_voice_endpoint_id: str = None  # Endpoint ID (deployment ID) for custom voice
+    personal_voice_speaker_profile_id: str = None  # Speaker profile ID for personal voice
+    speech_synthesizer: speechsdk.SpeechSynthesizer = None  # Speech synthesizer for avatar
+    speech_synthesizer_connection: speechsdk.Connection = None  # Speech synthesizer connection for avatar
+    speech_synthesizer_connected: bool = False  # Flag to indicate if the speech synthesizer is connected
+    speech_token: str = None  # Speech token for client side authentication with speech service
+    ice_token: str = None  # ICE token for ICE/TURN/Relay server connection
+    chat_initiated: bool = False  # Flag to indicate if the chat context is initiated
+    messages: list = field(default_factory=list)  # Chat messages (history)
+    data_sources: list = field(default_factory=list)  # Data sources for 'on your data' scenario
+    is_speaking: bool = False  # Flag to indicate if the avatar is speaking
+    speaking_text: str = None  # The text that the avatar is speaking
+    spoken_text_queue: list = field(default_factory=list)  # Queue to store the spoken text
+    speaking_thread: threading.Thread = None  # The thread to speak the spoken text queue
+    speak_thread_done: threading.Event = field(default_factory=threading.Event)  # Set when the speaking thread exits
+    last_speak_time: datetime.datetime = None  # The last time the avatar spoke
+    initial_greeting_sent: bool = False  # Flag to indicate if initial greeting has been sent
+    initial_greeting: str = None  # The initial greeting message
+    patient_name: str = None  # The current patient name
+    patient_data: dict = None  # The patient data from Elasticsearch
+
 
 # Global variables
-client_contexts = {}  # Client contexts
+client_contexts: dict[int, ClientContext] = {}  # Client contexts, keyed by the 128-bit integer value of the client id
+patient_data_executor = ThreadPoolExecutor(max_workers=8)  # Runs patient data lookups concurrently with the AOAI call
 speech_token = None  # Speech token
 ice_token = None  # ICE token
 if azure_openai_endpoint and azure_openai_api_key:
@@ -161,9 +198,9 @@ def getIceToken() -> Response:
 @app.route("/api/getStatus", methods=["GET"])
 def getStatus() -> Response:
     client_id = uuid.UUID(request.headers.get('ClientId'))
-    client_context = client_contexts[client_id]
+    client_context = client_contexts[client_id.int]
     status = {
-        'speechSynthesizerConnected': client_context['speech_synthesizer_connected']
+        'speechSynthesizerConnected': client_context.speech_synthesizer_connected
     }
     return Response(json.dumps(status), status=200)
 
@@ -175,54 +212,28 @@ def connectAvatar() -> Response:
     isReconnecting = request.headers.get('Reconnect') and request.headers.get('Reconnect').lower() == 'true'
     
     # Ensure client context exists before trying to disconnect
-    if client_id in client_contexts:
+    if client_id.int in client_contexts:
         # disconnect avatar if already connected
         disconnectAvatarInternal(client_id, isReconnecting)
     
     # Get or create client context
-    if client_id not in client_contexts:
+    if client_id.int not in client_contexts:
         print(f"⚠️ Client context not found for {client_id}, creating new one")
-        client_contexts[client_id] = {
-            'audio_input_stream': None,
-            'vad_audio_buffer': [],
-            'speech_recognizer': None,
-            'azure_openai_deployment_name': azure_openai_deployment_name,
-            'cognitive_search_index_name': cognitive_search_index_name,
-            'tts_voice': e ,
-            'custom_voice_endpoint_id': None,
-            'personal_voice_speaker_profile_id': None,
-            'speech_synthesizer': None,
-            'speech_synthesizer_connection': None,
-            'speech_synthesizer_connected': False,
-            'speech_token': None,
-            'ice_token': None,
-            'chat_initiated': False,
-            'messages': [],
-            'data_sources': [],
-            'is_speaking': False,
-            'speaking_text': None,
-            'spoken_text_queue': [],
-            'speaking_thread': None,
-            'last_speak_time': None,
-            'initial_greeting_sent': False,
-            'initial_greeting': None,
-            'patient_name': None,
-            'patient_data': None
-        }
+        client_contexts[client_id.int] = ClientContext()
     
-    client_context = client_contexts[client_id]
+    client_context = client_contexts[client_id.int]
 
     # Override default values with client provided values
-    client_context['azure_openai_deployment_name'] = (
+    client_context.azure_openai_deployment_name = (
         request.headers.get('AoaiDeploymentName') if request.headers.get('AoaiDeploymentName') else azure_openai_deployment_name)
-    client_context['cognitive_search_index_name'] = (
+    client_context.cognitive_search_index_name = (
         request.headers.get('CognitiveSearchIndexName') if request.headers.get('CognitiveSearchIndexName')
         else cognitive_search_index_name)
-    client_context['tts_voice'] = request.headers.get('TtsVoice') if request.headers.get('TtsVoice') else default_tts_voice
-    client_context['custom_voice_endpoint_id'] = request.headers.get('CustomVoiceEndpointId')
-    client_context['personal_voice_speaker_profile_id'] = request.headers.get('PersonalVoiceSpeakerProfileId')
+    client_context.tts_voice = request.headers.get('TtsVoice') if request.headers.get('TtsVoice') else default_tts_voice
+    client_context.custom_voice_endpoint_id = request.headers.get('CustomVoiceEndpointId')
+    client_context.personal_voice_speaker_profile_id = request.headers.get('PersonalVoiceSpeakerProfileId')
 
-    custom_voice_endpoint_id = client_context['custom_voice_endpoint_id']
+    custom_voice_endpoint_id = client_context.custom_voice_endpoint_id
 
     try:
         if speech_private_endpoint:
@@ -255,8 +266,8 @@ def connectAvatar() -> Response:
         # Create optimized audio config for lower latency
         audio_config = speechsdk.audio.AudioOutputConfig(use_default_speaker=True)
         
-        client_context['speech_synthesizer'] = speechsdk.SpeechSynthesizer(speech_config=speech_config, audio_config=audio_config)
-        speech_synthesizer = client_context['speech_synthesizer']
+        client_context.speech_synthesizer = speechsdk.SpeechSynthesizer(speech_config=speech_config, audio_config=audio_config)
+        speech_synthesizer = client_context.speech_synthesizer
         
         # Set additional properties for lower latency
         speech_synthesizer.properties.set_property(speechsdk.PropertyId.SpeechServiceConnection_SynthEnableCompressedAudioTransmission, "true")
@@ -291,7 +302,7 @@ def connectAvatar() -> Response:
         avatar_config = {
             'synthesis': {
                 'synthesisConfig': {
-                    'voice': client_context['tts_voice']
+                    'voice': client_context.tts_voice
                 },
                 'video': {
                     'protocol': {
@@ -360,15 +371,15 @@ def connectAvatar() -> Response:
 
         def tts_disconnected_cb(evt):
             print('TTS Avatar service disconnected.')
-            client_context['speech_synthesizer_connection'] = None
-            client_context['speech_synthesizer_connected'] = False
+            client_context.speech_synthesizer_connection = None
+            client_context.speech_synthesizer_connected = False
             if enable_websockets:
                 socketio.emit("response", {'path': 'api.event', 'eventType': 'SPEECH_SYNTHESIZER_DISCONNECTED'}, room=client_id)
 
         connection.disconnected.connect(tts_disconnected_cb)
         connection.set_message_property('speech.config', 'context', json.dumps(avatar_config))
-        client_context['speech_synthesizer_connection'] = connection
-        client_context['speech_synthesizer_connected'] = True
+        client_context.speech_synthesizer_connection = connection
+        client_context.speech_synthesizer_connected = True
         if enable_websockets:
             socketio.emit("response", {'path': 'api.event', 'eventType': 'SPEECH_SYNTHESIZER_CONNECTED'}, room=client_id)
 
@@ -385,7 +396,7 @@ def connectAvatar() -> Response:
 
         # Initialize chat context and send initial greeting asking for patient name
         initializeChatContext("", client_id)
-        client_context['chat_initiated'] = True
+        client_context.chat_initiated = True
         
         # Send initial greeting asking for patient name
         initial_greeting = "Hello! I'm your clinical assistant. Please provide the patient's name."
@@ -396,8 +407,8 @@ def connectAvatar() -> Response:
         else:
             # For non-websocket mode, we'll need to handle this differently
             # The greeting will be sent when the first user interaction occurs
-            client_context['initial_greeting_sent'] = False
-            client_context['initial_greeting'] = initial_greeting
+            client_context.initial_greeting_sent = False
+            client_context.initial_greeting = initial_greeting
 
         return Response(remoteSdp, status=200)
 
@@ -422,7 +433,7 @@ def connectSTT() -> Response:
     else:
         system_prompt = request.headers.get('SystemPrompt')
     
-    client_context = client_contexts[client_id]
+    client_context = client_contexts[client_id.int]
     try:
         if speech_private_endpoint:
             speech_private_endpoint_wss = speech_private_endpoint.replace('https://', 'wss://')
@@ -447,11 +458,11 @@ def connectSTT() -> Response:
                     subscription=speech_key, endpoint=f'wss://{speech_region}.stt.speech.microsoft.com/speech/universal/v2')
 
         audio_input_stream = speechsdk.audio.PushAudioInputStream()
-        client_context['audio_input_stream'] = audio_input_stream
+        client_context.audio_input_stream = audio_input_stream
 
         audio_config = speechsdk.audio.AudioConfig(stream=audio_input_stream)
         speech_recognizer = speechsdk.SpeechRecognizer(speech_config=speech_config, audio_config=audio_config)
-        client_context['speech_recognizer'] = speech_recognizer
+        client_context.speech_recognizer = speech_recognizer
 
         speech_recognizer.session_started.connect(lambda evt: print(f'STT session started - session id: {evt.session_id}'))
         speech_recognizer.session_stopped.connect(lambda evt: print('STT session stopped.'))
@@ -471,26 +482,21 @@ def connectSTT() -> Response:
                     stt_latency = round((recognition_result_received_time - speech_recognition_start_time).total_seconds() * 1000 - speech_finished_offset)  # noqa: E501
                     print(f'STT latency: {stt_latency}ms')
                     socketio.emit("response", {'path': 'api.chat', 'chatResponse': f"<STTL>{stt_latency}</STTL>"}, room=client_id)
-                    chat_initiated = client_context['chat_initiated']
+                    chat_initiated = client_context.chat_initiated
                     if not chat_initiated:
                         initializeChatContext(system_prompt, client_id)
-                        client_context['chat_initiated'] = True
+                        client_context.chat_initiated = True
                     
                     # Check if we need to send initial greeting for STT mode
-                    initial_greeting_sent = client_context.get('initial_greeting_sent', True)
-                    initial_greeting = client_context.get('initial_greeting', '')
+                    initial_greeting_sent = client_context.initial_greeting_sent
+                    initial_greeting = client_context.initial_greeting
                     
                     # If this is the first interaction and we have an initial greeting, send it first
                     if not initial_greeting_sent and initial_greeting:
-                        client_context['initial_greeting_sent'] = True
+                        client_context.initial_greeting_sent = True
                         socketio.emit("response", {'path': 'api.chat', 'chatResponse': 'Assistant: ' + initial_greeting + '\n\n'}, room=client_id)
                     
-                    first_response_chunk = True
-                    for chat_response in handleUserQuery(user_query, client_id):
-                        if first_response_chunk:
-                            socketio.emit("response", {'path': 'api.chat', 'chatResponse': 'Assistant: '}, room=client_id)
-                            first_response_chunk = False
-                        socketio.emit("response", {'path': 'api.chat', 'chatResponse': chat_response}, room=client_id)
+                    emitChatResponse(handleUserQuery(user_query, client_id), client_id)
                 except Exception as e:
                     print(f"Error in handling user query: {e}")
         speech_recognizer.recognized.connect(stt_recognized_cb)
@@ -549,21 +555,21 @@ def stopSpeaking() -> Response:
 @app.route("/api/chat", methods=["POST"])
 def chat() -> Response:
     client_id = uuid.UUID(request.headers.get('ClientId'))
-    client_context = client_contexts[client_id]
-    chat_initiated = client_context['chat_initiated']
+    client_context = client_contexts[client_id.int]
+    chat_initiated = client_context.chat_initiated
     if not chat_initiated:
         initializeChatContext(request.headers.get('SystemPrompt'), client_id)
-        client_context['chat_initiated'] = True
+        client_context.chat_initiated = True
     
     # Check if we need to send initial greeting for non-websocket mode
-    initial_greeting_sent = client_context.get('initial_greeting_sent', True)
-    initial_greeting = client_context.get('initial_greeting', '')
+    initial_greeting_sent = client_context.initial_greeting_sent
+    initial_greeting = client_context.initial_greeting
     
     user_query = request.data.decode('utf-8')
     
     # If this is the first interaction and we have an initial greeting, send it first
     if not initial_greeting_sent and initial_greeting:
-        client_context['initial_greeting_sent'] = True
+        client_context.initial_greeting_sent = True
         # Create a generator that yields the greeting first, then the user query response
         def combined_response():
             yield 'Assistant: ' + initial_greeting + '\n\n'
@@ -577,9 +583,9 @@ def chat() -> Response:
 @app.route("/api/chat/continueSpeaking", methods=["POST"])
 def continueSpeaking() -> Response:
     client_id = uuid.UUID(request.headers.get('ClientId'))
-    client_context = client_contexts[client_id]
-    spoken_text_queue = client_context['spoken_text_queue']
-    speaking_text = client_context['speaking_text']
+    client_context = client_contexts[client_id.int]
+    spoken_text_queue = client_context.spoken_text_queue
+    speaking_text = client_context.speaking_text
     if speaking_text and repeat_speaking_sentence_after_reconnection:
         spoken_text_queue.insert(0, speaking_text)
     if len(spoken_text_queue) > 0:
@@ -591,14 +597,14 @@ def continueSpeaking() -> Response:
 @app.route("/api/chat/clearHistory", methods=["POST"])
 def clearChatHistory() -> Response:
     client_id = uuid.UUID(request.headers.get('ClientId'))
-    client_context = client_contexts[client_id]
+    client_context = client_contexts[client_id.int]
     initializeChatContext(request.headers.get('SystemPrompt'), client_id)
-    client_context['chat_initiated'] = True
+    client_context.chat_initiated = True
     
     # Send a fresh initial greeting after clearing history
     initial_greeting = "Hello! I'm your clinical assistant. Please provide the patient's name."
-    client_context['initial_greeting'] = initial_greeting
-    client_context['initial_greeting_sent'] = False
+    client_context.initial_greeting = initial_greeting
+    client_context.initial_greeting_sent = False
     
     return Response('Chat history cleared.', status=200)
 
@@ -666,7 +672,7 @@ def releaseClient() -> Response:
         disconnectAvatarInternal(client_id, False)
         disconnectSttInternal(client_id)
         time.sleep(2)  # Wait some time for the connection to close
-        client_contexts.pop(client_id)
+        client_contexts.pop(client_id.int)
         print(f"Client context released for client {client_id}.")
         return Response('Client context released.', status=200)
     except Exception as e:
@@ -685,16 +691,16 @@ def handleWsConnection():
 def handleWsMessage(message):
     client_id = uuid.UUID(message.get('clientId'))
     path = message.get('path')
-    client_context = client_contexts[client_id]
+    client_context = client_contexts[client_id.int]
     if path == 'api.audio':
-        chat_initiated = client_context['chat_initiated']
+        chat_initiated = client_context.chat_initiated
         audio_chunk = message.get('audioChunk')
         audio_chunk_binary = base64.b64decode(audio_chunk)
-        audio_input_stream = client_context['audio_input_stream']
+        audio_input_stream = client_context.audio_input_stream
         if audio_input_stream:
             audio_input_stream.write(audio_chunk_binary)
         if vad_iterator:
-            audio_buffer = client_context['vad_audio_buffer']
+            audio_buffer = client_context.vad_audio_buffer
             audio_buffer.extend(audio_chunk_binary)
             if len(audio_buffer) >= 1024:
                 audio_chunk_int = np.frombuffer(bytes(audio_buffer[:1024]), dtype=np.int16)
@@ -705,62 +711,52 @@ def handleWsMessage(message):
                     print("Voice activity detected.")
                     stopSpeakingInternal(client_id, False)
     elif path == 'api.chat':
-        chat_initiated = client_context['chat_initiated']
+        chat_initiated = client_context.chat_initiated
         if not chat_initiated:
             initializeChatContext(message.get('systemPrompt'), client_id)
-            client_context['chat_initiated'] = True
+            client_context.chat_initiated = True
         
         # Check if we need to send initial greeting for websocket mode
-        initial_greeting_sent = client_context.get('initial_greeting_sent', True)
-        initial_greeting = client_context.get('initial_greeting', '')
+        initial_greeting_sent = client_context.initial_greeting_sent
+        initial_greeting = client_context.initial_greeting
         
         user_query = message.get('userQuery')
         
         # If this is the first interaction and we have an initial greeting, send it first
         if not initial_greeting_sent and initial_greeting:
-            client_context['initial_greeting_sent'] = True
+            client_context.initial_greeting_sent = True
             socketio.emit("response", {'path': 'api.chat', 'chatResponse': 'Assistant: ' + initial_greeting + '\n\n'}, room=client_id)
         
-        first_response_chunk = True
-        for chat_response in handleUserQuery(user_query, client_id):
-            if first_response_chunk:
-                socketio.emit("response", {'path': 'api.chat', 'chatResponse': 'Assistant: '}, room=client_id)
-                first_response_chunk = False
-            socketio.emit("response", {'path': 'api.chat', 'chatResponse': chat_response}, room=client_id)
+        emitChatResponse(handleUserQuery(user_query, client_id), client_id)
     elif path == 'api.stopSpeaking':
         stopSpeakingInternal(client_id, False)
 
 
+# Emit the assistant reply chunks to the client through websocket.
+# Small chunks (tokens) are coalesced into fewer frames, flushed by size or by elapsed time.
+def emitChatResponse(chat_responses, client_id: uuid.UUID) -> None:
+    buffered_response = ''
+    first_response_chunk = True
+    last_emit_time = time.monotonic()
+    for chat_response in chat_responses:
+        # Send the 'Assistant: ' prefix inline with the first chunk instead of as its own frame
+        if first_response_chunk and chat_response:
+            chat_response = 'Assistant: ' + chat_response
+            first_response_chunk = False
+        buffered_response += chat_response
+        if (len(buffered_response) >= chat_response_batch_size or
+                (time.monotonic() - last_emit_time) * 1000 >= chat_response_batch_interval_ms):
+            socketio.emit("response", {'path': 'api.chat', 'chatResponse': buffered_response}, room=client_id)
+            buffered_response = ''
+            last_emit_time = time.monotonic()
+    if buffered_response:
+        socketio.emit("response", {'path': 'api.chat', 'chatResponse': buffered_response}, room=client_id)
+
+
 # Initialize the client by creating a client id and an initial context
 def initializeClient() -> uuid.UUID:
     client_id = uuid.uuid4()
-    client_contexts[client_id] = {
-        'audio_input_stream': None,  # Audio input stream for speech recognition
-        'vad_audio_buffer': [],  # Audio input buffer for VAD
-        'speech_recognizer': None,  # Speech recognizer for user speech
-        'azure_openai_deployment_name': azure_openai_deployment_name,  # Azure OpenAI deployment name
-        'cognitive_search_index_name': cognitive_search_index_name,  # Cognitive search index name
-        'tts_voice': default_tts_voice,  # TTS voice
-        'custom_voice_endpoint_id': None,  # Endpoint ID (deployment ID) for custom voice
-        'personal_voice_speaker_profile_id': None,  # Speaker profile ID for personal voice
-        'speech_synthesizer': None,  # Speech synthesizer for avatar
-        'speech_synthesizer_connection': None,  # Speech synthesizer connection for avatar
-        'speech_synthesizer_connected': False,  # Flag to indicate if the speech synthesizer is connected
-        'speech_token': None,  # Speech token for client side authentication with speech service
-        'ice_token': None,  # ICE token for ICE/TURN/Relay server connection
-        'chat_initiated': False,  # Flag to indicate if the chat context is initiated
-        'messages': [],  # Chat messages (history)
-        'data_sources': [],  # Data sources for 'on your data' scenario
-        'is_speaking': False,  # Flag to indicate if the avatar is speaking
-        'speaking_text': None,  # The text that the avatar is speaking
-        'spoken_text_queue': [],  # Queue to store the spoken text
-        'speaking_thread': None,  # The thread to speak the spoken text queue
-        'last_speak_time': None,  # The last time the avatar spoke
-        'initial_greeting_sent': False,  # Flag to indicate if initial greeting has been sent
-        'initial_greeting': None,  # The initial greeting message
-        'patient_name': None,  # The current patient name
-        'patient_data': None  # The patient data from Elasticsearch
-    }
+    client_contexts[client_id.int] = ClientContext()
     return client_id
 
 
@@ -895,6 +891,23 @@ def getPatientMedicationHistory(patient_data: dict) -> list:
     
     return list(set(all_medications))  # Remove duplicates
 
+# Patient record fields returned by Elasticsearch, and the query settings shared by every patient lookup
+_ES_SOURCE_FIELDS = (
+    'date_of_visit',
+    'patient_complaint',
+    'diagnosis',
+    'doctor_notes',
+    'drugs_prescribed',
+    'patient_age_at_visit',
+    'patient_name'
+)
+_ES_QUERY_TEMPLATE = {
+    "_source": list(_ES_SOURCE_FIELDS),
+    "size": 100,
+    "track_total_hits": False
+}
+
+
 # Query patient data from Elasticsearch
 def queryPatientData(patient_name: str) -> dict:
     """
@@ -909,22 +922,16 @@ def queryPatientData(patient_name: str) -> dict:
         return {"error": "Elasticsearch client not configured"}
     
     try:
-        # Use a simpler query structure that's more compatible with standard Elasticsearch
+        # Exact lookup on the keyword subfield in filter context: no scoring, no analysis, and cacheable by ES
         query = {
             "query": {
-                "match": {
-                    "patient_name": patient_name
+                "bool": {
+                    "filter": [
+                        {"term": {"patient_name.keyword": patient_name}}
+                    ]
                 }
             },
-            "_source": [
-                "date_of_visit",
-                "patient_complaint", 
-                "diagnosis",
-                "doctor_notes",
-                "drugs_prescribed",
-                "patient_age_at_visit",
-                "patient_name"
-            ]
+            **_ES_QUERY_TEMPLATE
         }
         
         print(f"Executing Elasticsearch query: {json.dumps(query, indent=2)}")
@@ -941,23 +948,29 @@ def queryPatientData(patient_name: str) -> dict:
         else:
             response_dict = response
         
+        # Fall back to an analyzed match (all terms required) for user-typed names that don't match exactly
+        if not response_dict.get('hits', {}).get('hits'):
+            print(f"No exact match for '{patient_name}', falling back to match query")
+            query['query'] = {
+                "match": {
+                    "patient_name": {
+                        "query": patient_name,
+                        "operator": "and"
+                    }
+                }
+            }
+            response = elastic_client.search(
+                index=elastic_index_name,
+                body=query
+            )
+            response_dict = response.body if hasattr(response, 'body') else response
+        
         print(f"Elasticsearch response: {json.dumps(response_dict, indent=2)}")
         
         # Extract and format the results
         hits = response_dict.get('hits', {}).get('hits', [])
-        patient_records = []
-        
-        for hit in hits:
-            source = hit.get('_source', {})
-            patient_records.append({
-                'date_of_visit': source.get('date_of_visit'),
-                'patient_complaint': source.get('patient_complaint'),
-                'diagnosis': source.get('diagnosis'),
-                'doctor_notes': source.get('doctor_notes'),
-                'drugs_prescribed': source.get('drugs_prescribed'),
-                'patient_age_at_visit': source.get('patient_age_at_visit'),
-                'patient_name': source.get('patient_name')
-            })
+        # _source is already restricted to _ES_SOURCE_FIELDS, so pass it through without copying
+        patient_records = [hit.get('_source', {}) for hit in hits]
         
         return {
             "success": True,
@@ -1184,46 +1197,51 @@ def createEnhancedPatientSummary(patient_name: str, patient_data: dict) -> str:
         return f"{main_response}. {additional_info.capitalize()}."
 
 
+# Build the Azure search data source for 'on your data' scenario. Every chat gets its own nested dicts,
+# so changes made for one request can't leak into another.
+def buildAzureSearchDataSource(index_name: str, role_information: str) -> dict:
+    return {
+        'type': 'azure_search',
+        'parameters': {
+            'endpoint': cognitive_search_endpoint,
+            'index_name': index_name,
+            'authentication': {
+                'type': 'api_key',
+                'key': cognitive_search_api_key
+            },
+            'semantic_configuration': '',
+            'query_type': 'simple',
+            'fields_mapping': {
+                'content_fields_separator': '\n',
+                'content_fields': ['content'],
+                'filepath_field': None,
+                'title_field': 'title',
+                'url_field': None
+            },
+            'in_scope': True,
+            'role_information': role_information
+        }
+    }
+
+
 # Initialize the chat context, e.g. chat history (messages), data sources, etc. For chat scenario.
 def initializeChatContext(system_prompt: str, client_id: uuid.UUID) -> None:
-    client_context = client_contexts[client_id]
-    cognitive_search_index_name = client_context['cognitive_search_index_name']
-    messages = client_context['messages']
-    data_sources = client_context['data_sources']
+    client_context = client_contexts[client_id.int]
+    cognitive_search_index_name = client_context.cognitive_search_index_name
+    messages = client_context.messages
+    data_sources = client_context.data_sources
 
     # Clear patient-specific data to start fresh
-    client_context['patient_name'] = None
-    client_context['patient_data'] = None
-    client_context['initial_greeting_sent'] = False
-    client_context['initial_greeting'] = None
+    client_context.patient_name = None
+    client_context.patient_data = None
+    client_context.initial_greeting_sent = False
+    client_context.initial_greeting = None
 
     # Initialize data sources for 'on your data' scenario
     data_sources.clear()
     if cognitive_search_endpoint and cognitive_search_api_key and cognitive_search_index_name:
         # On-your-data scenario
-        data_source = {
-            'type': 'azure_search',
-            'parameters': {
-                'endpoint': cognitive_search_endpoint,
-                'index_name': cognitive_search_index_name,
-                'authentication': {
-                    'type': 'api_key',
-                    'key': cognitive_search_api_key
-                },
-                'semantic_configuration': '',
-                'query_type': 'simple',
-                'fields_mapping': {
-                    'content_fields_separator': '\n',
-                    'content_fields': ['content'],
-                    'filepath_field': None,
-                    'title_field': 'title',
-                    'url_field': None
-                },
-                'in_scope': True,
-                'role_information': system_prompt
-            }
-        }
-        data_sources.append(data_source)
+        data_sources.append(buildAzureSearchDataSource(cognitive_search_index_name, system_prompt))
 
     # Initialize messages
     messages.clear()
@@ -1238,12 +1256,12 @@ def initializeChatContext(system_prompt: str, client_id: uuid.UUID) -> None:
 # Handle the user query and return the assistant reply. For chat scenario.
 # The function is a generator, which yields the assistant reply in chunks.
 def handleUserQuery(user_query: str, client_id: uuid.UUID):
-    client_context = client_contexts[client_id]
-    azure_openai_deployment_name = client_context['azure_openai_deployment_name']
-    messages = client_context['messages']
-    data_sources = client_context['data_sources']
-    patient_name = client_context.get('patient_name')
-    patient_data = client_context.get('patient_data')
+    client_context = client_contexts[client_id.int]
+    azure_openai_deployment_name = client_context.azure_openai_deployment_name
+    messages = client_context.messages
+    data_sources = client_context.data_sources
+    patient_name = client_context.patient_name
+    patient_data = client_context.patient_data
 
     # Add user message to conversation
     chat_message = {
@@ -1398,6 +1416,22 @@ def handleUserQuery(user_query: str, client_id: uuid.UUID):
     # Smart tool usage logic
     tool_choice = "auto"
     extracted_patient_name = None
+    prefetched_patient_data = {}  # Lowercased patient name -> lookup started ahead of the AOAI call
+
+    # Use the prefetched lookup when it is for the same patient, otherwise query Elasticsearch directly
+    def getPatientData(name: str) -> dict:
+        prefetch = prefetched_patient_data.pop(name.strip().lower(), None)
+        if prefetch is not None:
+            return prefetch.result()
+        # The lookup was started for another name, so it won't be used
+        cancelPatientDataPrefetches()
+        return queryPatientData(name)
+
+    # Drop prefetched lookups that won't be used; ones that haven't started yet never run
+    def cancelPatientDataPrefetches() -> None:
+        for prefetch in prefetched_patient_data.values():
+            prefetch.cancel()
+        prefetched_patient_data.clear()
     
     # Check if this is a summary request for an already loaded patient
     summary_keywords = ["summarize", "summary", "overview", "last visit", "recent", "history"]
@@ -1422,6 +1456,11 @@ def handleUserQuery(user_query: str, client_id: uuid.UUID):
             name_match = re.search(r"(?:patient\s+(?:name\s+)?(?:is\s+)?|mr\.?\s+|ms\.?\s+|mrs\.?\s+|dr\.?\s+)([A-Z][a-z]+\s+[A-Z][a-z]+)", user_query)
             if name_match:
                 extracted_patient_name = name_match.group(1)
+        
+        # Start the patient lookup now, so the Elasticsearch round trip overlaps with the AOAI call below
+        if extracted_patient_name:
+            prefetched_patient_data[extracted_patient_name.strip().lower()] = patient_data_executor.submit(
+                queryPatientData, extracted_patient_name)
     elif patient_data and is_medication_query:
         # Patient data already loaded and user asks about medications - use medication tool
         tool_choice = {"type": "function", "function": {"name": "get_medication_info"}}
@@ -1479,10 +1518,10 @@ def handleUserQuery(user_query: str, client_id: uuid.UUID):
                         print(f"⚠️ No patient_name provided in function arguments")
                         continue
                         
-                    result = queryPatientData(patient_name)
+                    result = getPatientData(patient_name)
                     # Store patient data in context
-                    client_context['patient_name'] = patient_name
-                    client_context['patient_data'] = result
+                    client_context.patient_name = patient_name
+                    client_context.patient_data = result
                     
                     # Add a conversational response to the result
                     if result.get('success'):
@@ -1531,11 +1570,11 @@ def handleUserQuery(user_query: str, client_id: uuid.UUID):
                         print(f"⚠️ No patient_name provided in function arguments")
                         continue
                         
-                    if not client_context.get('patient_data'):
+                    if not client_context.patient_data:
                         patient_data = queryPatientData(patient_name)
-                        client_context['patient_data'] = patient_data
+                        client_context.patient_data = patient_data
                     else:
-                        patient_data = client_context['patient_data']
+                        patient_data = client_context.patient_data
                     
                     # Create enhanced summary with clinical insights
                     if patient_data.get('success'):
@@ -1565,11 +1604,11 @@ def handleUserQuery(user_query: str, client_id: uuid.UUID):
                         print(f"⚠️ No patient_name provided in function arguments")
                         continue
                         
-                    if not client_context.get('patient_data'):
+                    if not client_context.patient_data:
                         patient_data = queryPatientData(patient_name)
-                        client_context['patient_data'] = patient_data
+                        client_context.patient_data = patient_data
                     else:
-                        patient_data = client_context['patient_data']
+                        patient_data = client_context.patient_data
                     
                     # Get medication information
                     if patient_data.get('success'):
@@ -1659,12 +1698,12 @@ def handleUserQuery(user_query: str, client_id: uuid.UUID):
         spoken_sentence = ''
 
     # Fallback: If patient name was detected but no tool was called, force the tool call
-    if contains_patient_name and extracted_patient_name and not client_context.get('patient_data'):
+    if contains_patient_name and extracted_patient_name and not client_context.patient_data:
         print(f"🔄 Fallback: Automatically calling get_patient_data for '{extracted_patient_name}'")
         try:
-            result = queryPatientData(extracted_patient_name)
-            client_context['patient_name'] = extracted_patient_name
-            client_context['patient_data'] = result
+            result = getPatientData(extracted_patient_name)
+            client_context.patient_name = extracted_patient_name
+            client_context.patient_data = result
             
             # Note: We don't add tool messages to conversation history in fallback mode
             # The patient data is stored in client_context and will be used by tools when needed
@@ -1685,6 +1724,9 @@ def handleUserQuery(user_query: str, client_id: uuid.UUID):
             print(f"Error in fallback patient data retrieval: {e}")
             yield f"Error retrieving data for {extracted_patient_name}."
 
+    # The reply may not have needed the patient lookup started for it
+    cancelPatientDataPrefetches()
+
     # Note: Removed invalid tool message addition that was causing API errors
     # Tool messages should only be added in response to actual tool_calls from the assistant
 
@@ -1704,31 +1746,33 @@ def handleUserQuery(user_query: str, client_id: uuid.UUID):
 
 # Speak the given text. If there is already a speaking in progress, add the text to the queue. For chat scenario.
 def speakWithQueue(text: str, ending_silence_ms: int, client_id: uuid.UUID) -> None:
-    client_context = client_contexts[client_id]
-    spoken_text_queue = client_context['spoken_text_queue']
-    is_speaking = client_context['is_speaking']
+    client_context = client_contexts[client_id.int]
+    spoken_text_queue = client_context.spoken_text_queue
+    is_speaking = client_context.is_speaking
     if text:
         spoken_text_queue.append(text)
     if not is_speaking:
         def speakThread():
-            spoken_text_queue = client_context['spoken_text_queue']
-            tts_voice = client_context['tts_voice']
-            personal_voice_speaker_profile_id = client_context['personal_voice_speaker_profile_id']
-            client_context['is_speaking'] = True
+            spoken_text_queue = client_context.spoken_text_queue
+            tts_voice = client_context.tts_voice
+            personal_voice_speaker_profile_id = client_context.personal_voice_speaker_profile_id
+            client_context.is_speaking = True
             while len(spoken_text_queue) > 0:
                 text = spoken_text_queue.pop(0)
-                client_context['speaking_text'] = text
+                client_context.speaking_text = text
                 try:
                     speakText(text, tts_voice, personal_voice_speaker_profile_id, ending_silence_ms, client_id)
                 except Exception as e:
                     print(f"Error in speaking text: {e}")
                     break
-                client_context['last_speak_time'] = datetime.datetime.now(pytz.UTC)
-            client_context['is_speaking'] = False
-            client_context['speaking_text'] = None
+                client_context.last_speak_time = datetime.datetime.now(pytz.UTC)
+            client_context.is_speaking = False
+            client_context.speaking_text = None
+            client_context.speak_thread_done.set()
             print("Speaking thread stopped.")
-        client_context['speaking_thread'] = threading.Thread(target=speakThread)
-        client_context['speaking_thread'].start()
+        client_context.speak_thread_done.clear()
+        client_context.speaking_thread = threading.Thread(target=speakThread)
+        client_context.speaking_thread.start()
 
 
 # Speak the given text.
@@ -1784,7 +1828,7 @@ def speakText(text: str, voice: str, speaker_profile_id: str, ending_silence_ms:
 
 # Speak the given ssml with speech sdk
 def speakSsml(ssml: str, client_id: uuid.UUID, asynchronized: bool) -> str:
-    speech_synthesizer = client_contexts[client_id]['speech_synthesizer']
+    speech_synthesizer = client_contexts[client_id.int].speech_synthesizer
     speech_sythesis_result = (
         speech_synthesizer.start_speaking_ssml_async(ssml).get() if asynchronized
         else speech_synthesizer.speak_ssml_async(ssml).get())
@@ -1800,16 +1844,16 @@ def speakSsml(ssml: str, client_id: uuid.UUID, asynchronized: bool) -> str:
 # Stop speaking internal function
 def stopSpeakingInternal(client_id: uuid.UUID, skipClearingSpokenTextQueue: bool) -> None:
     # Check if client context exists before accessing it
-    if client_id not in client_contexts:
+    if client_id.int not in client_contexts:
         print(f"⚠️ Client context not found for {client_id} during stop speaking")
         return
         
-    client_context = client_contexts[client_id]
-    client_context['is_speaking'] = False
+    client_context = client_contexts[client_id.int]
+    client_context.is_speaking = False
     if not skipClearingSpokenTextQueue:
-        spoken_text_queue = client_context.get('spoken_text_queue', [])
+        spoken_text_queue = client_context.spoken_text_queue
         spoken_text_queue.clear()
-    avatar_connection = client_context.get('speech_synthesizer_connection')
+    avatar_connection = client_context.speech_synthesizer_connection
     if avatar_connection:
         avatar_connection.send_message_async('synthesis.control', '{"action":"stop"}').get()
 
@@ -1817,14 +1861,16 @@ def stopSpeakingInternal(client_id: uuid.UUID, skipClearingSpokenTextQueue: bool
 # Disconnect avatar internal function
 def disconnectAvatarInternal(client_id: uuid.UUID, isReconnecting: bool) -> None:
     # Check if client context exists before accessing it
-    if client_id not in client_contexts:
+    if client_id.int not in client_contexts:
         print(f"⚠️ Client context not found for {client_id} during disconnect")
         return
         
-    client_context = client_contexts[client_id]
+    client_context = client_contexts[client_id.int]
     stopSpeakingInternal(client_id, isReconnecting)
-    time.sleep(2)  # Wait for the speaking thread to stop
-    avatar_connection = client_context.get('speech_synthesizer_connection')
+    speaking_thread = client_context.speaking_thread
+    if speaking_thread and speaking_thread.is_alive():
+        client_context.speak_thread_done.wait(timeout=2)  # Wait for the speaking thread to stop
+    avatar_connection = client_context.speech_synthesizer_connection
     if avatar_connection:
         avatar_connection.close()
 
@@ -1832,21 +1878,21 @@ def disconnectAvatarInternal(client_id: uuid.UUID, isReconnecting: bool) -> None
 # Disconnect STT internal function
 def disconnectSttInternal(client_id: uuid.UUID) -> None:
     # Check if client context exists before accessing it
-    if client_id not in client_contexts:
+    if client_id.int not in client_contexts:
         print(f"⚠️ Client context not found for {client_id} during STT disconnect")
         return
         
-    client_context = client_contexts[client_id]
-    speech_recognizer = client_context.get('speech_recognizer')
-    audio_input_stream = client_context.get('audio_input_stream')
+    client_context = client_contexts[client_id.int]
+    speech_recognizer = client_context.speech_recognizer
+    audio_input_stream = client_context.audio_input_stream
     if speech_recognizer:
         speech_recognizer.stop_continuous_recognition()
         connection = speechsdk.Connection.from_recognizer(speech_recognizer)
         connection.close()
-        client_context['speech_recognizer'] = None
+        client_context.speech_recognizer = None
     if audio_input_stream:
         audio_input_stream.close()
-        client_context['audio_input_stream'] = None
+        client_context.audio_input_stream = None
 
 
 # Start the speech token refresh thread
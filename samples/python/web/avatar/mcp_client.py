@@ -7,26 +7,129 @@ Handles communication with MCP server and streaming responses
 import asyncio
 import json
 import logging
-from typing import Dict, List, Any, AsyncGenerator, Optional
+import time
+from collections import OrderedDict
+from typing import Dict, List, Any, AsyncGenerator, Awaitable, Callable, Optional, Tuple
 import uuid
-import os
-import sys
-
-# Add the current directory to Python path
-sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from mcp.client.session import ClientSession
 from mcp.client.stdio import stdio_client
+from mcp_config import DEFERRED_TOOLS, TOOL_VALIDATORS, get_config
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
+# Handlers are configured by the host application
 logger = logging.getLogger(__name__)
 
+# Fast JSON path for per-chunk decode/encode; falls back to the stdlib when orjson isn't installed
+try:
+    import orjson
+    _json_dumps = orjson.dumps
+    _json_loads = orjson.loads
+except ImportError:
+    def _json_dumps(obj: Any) -> bytes:
+        return json.dumps(obj, separators=(",", ":")).encode()
+    _json_loads = json.loads
+
+def _ndjson(event_type: str, payload: Any) -> bytes:
+    """Encode one streamed event as a newline-delimited JSON frame"""
+    return _json_dumps({"t": event_type, "p": payload}) + b"\n"
+
+_NOT_CONNECTED_MESSAGE = "MCP client not connected. Please check server status."
+
+# Event type -> prefix used by the plain-text stream
+_TEXT_PREFIXES = {"text": "", "status": "🔍 ", "complete": "✅ ", "error": "❌ "}
+
+# How search_tools is described to the LLM, with its arguments since it has no server-side schema
+_SEARCH_TOOLS_SUMMARY = ('Search for more tools by keyword; search_tools(query, detail) with detail "names", '
+                         '"brief" or "full" (full includes input schemas)')
+
+# Max time buffered text is held back before being flushed to the caller, in seconds
+_TEXT_FLUSH_INTERVAL = 0.02
+
+class _TextCoalescer:
+    """Buffers streamed text fragments so they are yielded in fewer, larger pieces"""
+    
+    def __init__(self, chunk_size: int):
+        self.chunk_size = chunk_size
+        self.buf: List[str] = []
+        self.size = 0
+        self.last_flush = time.monotonic()
+    
+    def __bool__(self) -> bool:
+        return self.size > 0
+    
+    def add(self, text: str):
+        """Add a text fragment to the buffer"""
+        self.buf.append(text)
+        self.size += len(text)
+    
+    def ready(self) -> bool:
+        """Whether the buffer reached the chunk size or has been held for the flush interval"""
+        return self.size >= self.chunk_size or time.monotonic() - self.last_flush > _TEXT_FLUSH_INTERVAL
+    
+    def flush(self) -> str:
+        """Return the buffered text and clear the buffer"""
+        text = "".join(self.buf)
+        self.buf.clear()
+        self.size = 0
+        self.last_flush = time.monotonic()
+        return text
+
+class _TTLCache:
+    """Small LRU cache whose entries expire after a fixed time to live, in seconds"""
+    
+    def __init__(self, size: int, ttl: float):
+        self.size = size
+        self.ttl = ttl
+        self._entries: "OrderedDict[Any, Tuple[Any, float]]" = OrderedDict()
+    
+    def get(self, key: Any) -> Any:
+        """Get a cached value, or None if missing or expired"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if time.monotonic() >= expires_at:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+    
+    def set(self, key: Any, value: Any):
+        """Cache a value, evicting the least recently used entry when full; a size of 0 disables caching"""
+        if self.size <= 0:
+            return
+        if key in self._entries:
+            del self._entries[key]
+        elif len(self._entries) >= self.size:
+            self._entries.popitem(last=False)
+        self._entries[key] = (value, time.monotonic() + self.ttl)
+
 class StreamingClinicalMCPClient:
     def __init__(self):
         self.session = None
         self.connected = False
-        self.available_tools = []
+        self.available_tools: Tuple[str, ...] = ()
+        self._available_tools_set: frozenset = frozenset()  # Same names as available_tools, for membership tests
+        self._default_tools: Tuple[str, ...] = ("search_tools",)  # Tools sent when the caller doesn't pick any
+        self._tool_summaries: Dict[str, str] = {}  # Tool name -> first sentence of its description
+        self._schema_cache: Dict[str, dict] = {}  # Tool name -> full input schema, only sent when search_tools asks for it
+        self._connect_lock = asyncio.Lock()  # Serializes the first connect across concurrent callers
+        self._text_chunk_size = get_config().get_streaming_config()["chunk_size"]
+        performance_config = get_config().get_performance_config()
+        self._cache = _TTLCache(performance_config["cache_size"], performance_config["cache_ttl"])
+        self._inflight: Dict[tuple, asyncio.Task] = {}  # Cache key -> task running the MCP call in flight
+        self._tool_semaphore = asyncio.Semaphore(performance_config["max_concurrent_requests"])  # Caps concurrent tool calls
+        # Tool name -> (coroutine, argument names in call order, argument defaults)
+        self._dispatch: Dict[str, Tuple[Callable[..., Awaitable[Dict[str, Any]]], Tuple[str, ...], Dict[str, Any]]] = {
+            "get_patient_data": (self.get_patient_data, ("patient_name",), {}),
+            "summarize_patient_data": (self.summarize_patient_data, ("patient_data", "summary_type"),
+                                       {"summary_type": "comprehensive"}),
+            "get_patient_summary": (self.get_patient_summary, ("patient_name", "summary_type"),
+                                    {"summary_type": "comprehensive"}),
+            "check_medication_interactions": (self.check_medication_interactions, ("new_medications", "existing_medications"),
+                                              {"new_medications": [], "existing_medications": []}),
+            "search_tools": (self._search_tools_call, ("query", "detail"), {"query": "", "detail": "names"}),
+        }
     
     async def connect(self, server_command: List[str] = None):
         """Connect to MCP server"""
@@ -41,10 +144,10 @@ class StreamingClinicalMCPClient:
             
             # Get available tools
             await self.discover_tools()
-            logger.info(f"Connected to MCP server with {len(self.available_tools)} tools")
+            logger.info("Connected to MCP server with %s tools", len(self.available_tools))
             
         except Exception as e:
-            logger.error(f"Failed to connect to MCP server: {e}")
+            logger.error("Failed to connect to MCP server: %s", e)
             self.connected = False
             raise
     
@@ -54,11 +157,61 @@ class StreamingClinicalMCPClient:
             if self.session:
                 # Get list of available tools
                 tools_response = await self.session.list_tools()
-                self.available_tools = [tool.name for tool in tools_response.tools]
-                logger.info(f"Discovered tools: {self.available_tools}")
+                self.available_tools = tuple(tool.name for tool in tools_response.tools)
+                self._available_tools_set = frozenset(self.available_tools)
+                # Deferred tools are left out of the default list; they are only sent when asked for
+                self._default_tools = tuple(tool for tool in self.available_tools if tool not in DEFERRED_TOOLS) + ("search_tools",)
+                # The LLM sees one-line summaries; the schemas arrive with the listing, so keep them for
+                # search_tools(detail="full") instead of listing the tools again
+                self._tool_summaries = {
+                    tool.name: (tool.description or "").split(".")[0]
+                    for tool in tools_response.tools
+                }
+                self._schema_cache = {tool.name: tool.inputSchema for tool in tools_response.tools}
+                logger.info("Discovered %d tools", len(self.available_tools))
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("Discovered tools: %s", self.available_tools)
         except Exception as e:
-            logger.error(f"Failed to discover tools: {e}")
-            self.available_tools = []
+            logger.error("Failed to discover tools: %s", e)
+            self.available_tools = ()
+            self._available_tools_set = frozenset()
+            self._default_tools = ("search_tools",)
+            self._tool_summaries = {}
+            self._schema_cache = {}
+    
+    def search_tools(self, query: str, detail: str = "names", limit: int = 5) -> List[Any]:
+        """Search discovered tools by keyword, scoring name matches 2 and description matches 1"""
+        terms = query.lower().split()
+        scored = []
+        for name, summary in self._tool_summaries.items():
+            name_lower = name.lower()
+            summary_lower = summary.lower()
+            score = sum(2 * (term in name_lower) + (term in summary_lower) for term in terms)
+            if score > 0:
+                scored.append((score, name))
+        scored.sort(key=lambda item: item[0], reverse=True)
+        names = [name for _, name in scored[:limit]]
+        
+        if detail == "brief":
+            return [{"name": name, "description": self._tool_summaries[name]} for name in names]
+        if detail == "full":
+            return [{"name": name, "description": self._tool_summaries[name], "input_schema": self._schema_cache.get(name)}
+                    for name in names]
+        return names
+    
+    async def _search_tools_call(self, query: str, detail: str = "names") -> Dict[str, Any]:
+        """Handle the client-side search_tools tool call"""
+        found = self.search_tools(query, detail)
+        return {"message": f"Found {len(found)} matching tools", "tools": found}
+    
+    def _tool_summary_message(self, tools: List[str]) -> Dict[str, str]:
+        """Build a system message listing the one-line summaries of the given tools, pointing to search_tools for the rest"""
+        summaries = {**self._tool_summaries, "search_tools": _SEARCH_TOOLS_SUMMARY}
+        lines = [f"- {name}: {summaries.get(name, '')}" for name in tools]
+        unlisted = len(self._tool_summaries.keys() - set(tools))
+        if unlisted and "search_tools" in tools:
+            lines.append(f"{unlisted} more tools are not listed; call search_tools to find them before using one.")
+        return {"role": "system", "content": "Available tools:\n" + "\n".join(lines)}
     
     async def stream_chat(self, messages: List[Dict[str, str]], tools: List[str] = None) -> AsyncGenerator[Dict[str, Any], None]:
         """Stream chat responses with tool calls"""
@@ -68,9 +221,12 @@ class StreamingClinicalMCPClient:
         try:
             # Filter tools to only include available ones
             if tools:
-                available_tools = [tool for tool in tools if tool in self.available_tools]
+                available_tools = [tool for tool in tools if tool in self._available_tools_set]
             else:
-                available_tools = self.available_tools
+                available_tools = self._default_tools
+            
+            # Advertise tools by their one-line summaries instead of full schemas
+            messages = [self._tool_summary_message(available_tools), *messages]
             
             # Start chat completion with streaming
             async for chunk in self.session.stream_chat_completion(
@@ -80,79 +236,186 @@ class StreamingClinicalMCPClient:
                 yield chunk
                 
         except Exception as e:
-            logger.error(f"Error in stream_chat: {e}")
+            logger.error("Error in stream_chat: %s", e)
             yield {"type": "error", "content": f"Error: {str(e)}"}
     
     async def handle_user_query_streaming(self, user_query: str, client_id: uuid.UUID) -> AsyncGenerator[str, None]:
-        """Handle user query with streaming responses"""
+        """Handle user query with streaming responses, yielded as text with 🔍/✅/❌ status indicators"""
+        async for event_type, payload in self._stream_user_query_events(user_query, client_id):
+            yield f"{_TEXT_PREFIXES[event_type]}{payload}"
+    
+    async def stream_user_query_ndjson(self, user_query: str, client_id: uuid.UUID) -> AsyncGenerator[bytes, None]:
+        """Handle user query with streaming responses, yielded as NDJSON frames (application/x-ndjson)"""
+        async for event_type, payload in self._stream_user_query_events(user_query, client_id):
+            yield _ndjson(event_type, payload)
+    
+    async def _stream_user_query_events(self, user_query: str, client_id: uuid.UUID) -> AsyncGenerator[Tuple[str, str], None]:
+        """Stream a user query as (event type, payload) pairs; types are text, status, complete and error"""
         if not self.connected:
-            yield "❌ MCP client not connected. Please check server status."
+            yield "error", _NOT_CONNECTED_MESSAGE
             return
         
+        coalescer = _TextCoalescer(self._text_chunk_size)
+        pending: List[Dict[str, Any]] = []  # Consecutive tool calls, run together once the batch ends
+        next_chunk = None
         try:
             messages = [{"role": "user", "content": user_query}]
+            stream = self.stream_chat(messages).__aiter__()
             
-            async for chunk in self.stream_chat(messages):
+            while True:
+                if next_chunk is None:
+                    next_chunk = asyncio.ensure_future(stream.__anext__())
+                # Flush buffered text or tool calls if the next chunk doesn't arrive within the flush window
+                if coalescer or pending:
+                    done, _ = await asyncio.wait({next_chunk}, timeout=_TEXT_FLUSH_INTERVAL)
+                    if not done:
+                        if pending:
+                            for event in await self._run_tool_calls(pending):
+                                yield event
+                            pending = []
+                        else:
+                            yield "text", coalescer.flush()
+                        continue
+                try:
+                    chunk = await next_chunk
+                except StopAsyncIteration:
+                    break
+                next_chunk = None
+                # Some transports hand over the raw JSON payload instead of a decoded dict
+                if isinstance(chunk, (bytes, str)):
+                    chunk = _json_loads(chunk)
+                
+                if chunk.get("type") == "tool_call":
+                    # Batch consecutive tool calls so independent ones run concurrently
+                    if coalescer:
+                        yield "text", coalescer.flush()
+                    pending.append(chunk)
+                    continue
+                if pending:
+                    for event in await self._run_tool_calls(pending):
+                        yield event
+                    pending = []
+                
                 if chunk.get("type") == "text":
-                    # Stream text response
-                    yield chunk.get("content", "")
-                elif chunk.get("type") == "tool_call":
-                    # Handle tool call
-                    tool_result = await self.execute_tool_call(chunk)
-                    if tool_result:
-                        yield f"🔍 {tool_result.get('message', 'Processing...')}"
-                elif chunk.get("type") == "tool_result":
+                    # Stream text response, coalesced into larger pieces
+                    coalescer.add(chunk.get("content", ""))
+                    if coalescer.ready():
+                        yield "text", coalescer.flush()
+                    continue
+                
+                # Flush buffered text before any other event to preserve ordering
+                if coalescer:
+                    yield "text", coalescer.flush()
+                if chunk.get("type") == "tool_result":
                     # Stream tool results
                     result_data = chunk.get("result", {})
                     if result_data.get("status") == "complete":
-                        yield f"✅ {result_data.get('message', 'Completed')}"
+                        yield "complete", result_data.get("message", "Completed")
                     elif result_data.get("status") == "error":
-                        yield f"❌ {result_data.get('message', 'Error occurred')}"
+                        yield "error", result_data.get("message", "Error occurred")
                 elif chunk.get("type") == "error":
-                    yield f"❌ {chunk.get('content', 'Unknown error')}"
+                    yield "error", chunk.get("content", "Unknown error")
+            
+            if pending:
+                for event in await self._run_tool_calls(pending):
+                    yield event
+            if coalescer:
+                yield "text", coalescer.flush()
                     
         except Exception as e:
-            logger.error(f"Error handling user query: {e}")
-            yield f"❌ Error processing request: {str(e)}"
+            logger.error("Error handling user query: %s", e)
+            if coalescer:
+                yield "text", coalescer.flush()
+            yield "error", f"Error processing request: {str(e)}"
+        finally:
+            if next_chunk is not None and not next_chunk.done():
+                next_chunk.cancel()
+    
+    async def _run_tool_calls(self, tool_calls: List[Dict[str, Any]]) -> List[Tuple[str, str]]:
+        """Execute a batch of tool calls concurrently and return their status events in call order"""
+        if len(tool_calls) == 1:
+            results = [await self.execute_tool_call(tool_calls[0])]
+        elif hasattr(asyncio, "TaskGroup"):
+            async with asyncio.TaskGroup() as tg:
+                tasks = [tg.create_task(self.execute_tool_call(tool_call)) for tool_call in tool_calls]
+            results = [task.result() for task in tasks]
+        else:
+            results = await asyncio.gather(*(self.execute_tool_call(tool_call) for tool_call in tool_calls))
+        return [("status", result.get("message", "Processing...")) for result in results if result]
     
     async def execute_tool_call(self, tool_call: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """Execute tool call and return result"""
         try:
             tool_name = tool_call.get("name")
             tool_args = tool_call.get("arguments", {})
+            # OpenAI-style tool calls carry their arguments as a JSON string
+            if isinstance(tool_args, (bytes, str)):
+                tool_args = _json_loads(tool_args) if tool_args else {}
             
-            if tool_name == "get_patient_data":
-                return await self.get_patient_data(tool_args.get("patient_name"))
-            elif tool_name == "summarize_patient_data":
-                return await self.summarize_patient_data(
-                    tool_args.get("patient_data"),
-                    tool_args.get("summary_type", "comprehensive")
-                )
-            elif tool_name == "get_patient_summary":
-                return await self.get_patient_summary(
-                    tool_args.get("patient_name"),
-                    tool_args.get("summary_type", "comprehensive")
-                )
-            elif tool_name == "check_medication_interactions":
-                return await self.check_medication_interactions(
-                    tool_args.get("new_medications", []),
-                    tool_args.get("existing_medications", [])
-                )
-            else:
-                logger.warning(f"Unknown tool: {tool_name}")
+            # Reject malformed arguments before spending an MCP round-trip on them
+            validate = TOOL_VALIDATORS.get(tool_name)
+            if validate is not None:
+                try:
+                    tool_args = validate(tool_args)
+                except ValueError as e:
+                    logger.warning("Invalid arguments for tool %s: %s", tool_name, e)
+                    return {"message": f"Invalid arguments for {tool_name}: {e}"}
+            
+            fn, keys, defaults = self._dispatch.get(tool_name, (None, None, None))
+            if fn is None:
+                logger.warning("Unknown tool: %s", tool_name)
                 return {"message": f"Unknown tool: {tool_name}"}
+            
+            args = [tool_args.get(key, defaults.get(key)) for key in keys]
+            async with self._tool_semaphore:
+                return await fn(*args)
                 
         except Exception as e:
-            logger.error(f"Error executing tool call: {e}")
+            logger.error("Error executing tool call: %s", e)
             return {"message": f"Error executing tool: {str(e)}"}
     
+    async def _single_flight(self, key: tuple, coro_factory: Callable[[], Awaitable[Any]]) -> Any:
+        """Run coro_factory once per key at a time; concurrent callers with the same key await the same result.
+        The work runs in its own task, so a caller that is cancelled only stops its own wait."""
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(coro_factory())
+            self._inflight[key] = task
+            
+            def done(finished: asyncio.Future):
+                if self._inflight.get(key) is finished:
+                    del self._inflight[key]
+                if not finished.cancelled():
+                    finished.exception()  # Mark as retrieved so it isn't logged when every caller has gone
+            
+            task.add_done_callback(done)
+        return await asyncio.shield(task)
+    
+    async def _call_cached_tool(self, tool_name: str, args: Dict[str, Any]) -> Any:
+        """Call an idempotent MCP tool, serving repeated calls from the TTL cache and coalescing concurrent ones"""
+        # Only the patient name is case-folded, matching the server's lookup; other arguments keep their case
+        key = (tool_name, tuple(sorted(
+            (name, value.strip().lower() if name == "patient_name" and isinstance(value, str) else value)
+            for name, value in args.items()
+        )))
+        cached = self._cache.get(key)
+        if cached is not None:
+            return cached
+        
+        async def call():
+            result = await self.session.call_tool(tool_name, args)
+            if not (isinstance(result, dict) and result.get("status") == "error"):
+                self._cache.set(key, result)
+            return result
+        
+        return await self._single_flight(key, call)
+    
     async def get_patient_data(self, patient_name: str) -> Dict[str, Any]:
         """Get patient data using MCP tool"""
         try:
-            result = await self.session.call_tool("get_patient_data", {"patient_name": patient_name})
-            return result
+            return await self._call_cached_tool("get_patient_data", {"patient_name": patient_name})
         except Exception as e:
-            logger.error(f"Error getting patient data: {e}")
+            logger.error("Error getting patient data: %s", e)
             return {"status": "error", "message": str(e)}
     
     async def summarize_patient_data(self, patient_data: dict, summary_type: str = "comprehensive") -> Dict[str, Any]:
@@ -164,19 +427,18 @@ class StreamingClinicalMCPClient:
             })
             return result
         except Exception as e:
-            logger.error(f"Error summarizing patient data: {e}")
+            logger.error("Error summarizing patient data: %s", e)
             return {"status": "error", "message": str(e)}
     
     async def get_patient_summary(self, patient_name: str, summary_type: str = "comprehensive") -> Dict[str, Any]:
         """Get patient summary using MCP tool"""
         try:
-            result = await self.session.call_tool("get_patient_summary", {
+            return await self._call_cached_tool("get_patient_summary", {
                 "patient_name": patient_name,
                 "summary_type": summary_type
             })
-            return result
         except Exception as e:
-            logger.error(f"Error getting patient summary: {e}")
+            logger.error("Error getting patient summary: %s", e)
             return {"status": "error", "message": str(e)}
     
     async def check_medication_interactions(self, new_medications: List[str], existing_medications: List[str]) -> Dict[str, Any]:
@@ -188,7 +450,7 @@ class StreamingClinicalMCPClient:
             })
             return result
         except Exception as e:
-            logger.error(f"Error checking medication interactions: {e}")
+            logger.error("Error checking medication interactions: %s", e)
             return {"status": "error", "message": str(e)}
     
     async def disconnect(self):
@@ -199,44 +461,78 @@ class StreamingClinicalMCPClient:
                 self.connected = False
                 logger.info("Disconnected from MCP server")
         except Exception as e:
-            logger.error(f"Error disconnecting from MCP server: {e}")
+            logger.error("Error disconnecting from MCP server: %s", e)
+
+    async def __aenter__(self) -> "StreamingClinicalMCPClient":
+        await self.connect()
+        return self
+    
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.disconnect()
 
-# Global MCP client instance
-mcp_client = StreamingClinicalMCPClient()
+# Global MCP client instance, created lazily and shared by every helper for the process lifetime
+mcp_client: Optional[StreamingClinicalMCPClient] = None
+
+def _get_or_create_mcp_client() -> StreamingClinicalMCPClient:
+    """Get the global MCP client instance, creating it on first use"""
+    global mcp_client
+    if mcp_client is None:
+        mcp_client = StreamingClinicalMCPClient()
+    return mcp_client
 
 async def initialize_mcp_client():
     """Initialize the global MCP client"""
     try:
-        await mcp_client.connect()
+        await _get_or_create_mcp_client().connect()
         return True
     except Exception as e:
-        logger.error(f"Failed to initialize MCP client: {e}")
+        logger.error("Failed to initialize MCP client: %s", e)
         return False
 
 async def get_mcp_client() -> StreamingClinicalMCPClient:
-    """Get the global MCP client instance"""
-    if not mcp_client.connected:
-        await initialize_mcp_client()
-    return mcp_client
+    """Get the global MCP client instance, connecting it once even under concurrent first calls"""
+    client = _get_or_create_mcp_client()
+    if not client.connected:
+        async with client._connect_lock:
+            if not client.connected:
+                await initialize_mcp_client()
+    return client
+
+def _connected_mcp_client() -> Optional[StreamingClinicalMCPClient]:
+    """The global MCP client if it is already connected, letting warm helper calls skip get_mcp_client"""
+    if mcp_client is not None and mcp_client.connected:
+        return mcp_client
+    return None
+
+async def close_mcp_client():
+    """Disconnect the global MCP client"""
+    if mcp_client is not None:
+        await mcp_client.disconnect()
 
 # Utility functions for integration with Flask app
 async def handle_user_query_with_mcp(user_query: str, client_id: uuid.UUID) -> AsyncGenerator[str, None]:
-    """Handle user query using MCP client"""
-    client = await get_mcp_client()
+    """Handle user query using MCP client, yielding text"""
+    client = _connected_mcp_client() or await get_mcp_client()
     async for chunk in client.handle_user_query_streaming(user_query, client_id):
         yield chunk
 
+async def stream_user_query_with_mcp(user_query: str, client_id: uuid.UUID) -> AsyncGenerator[bytes, None]:
+    """Handle user query using MCP client, yielding NDJSON frames (application/x-ndjson)"""
+    client = _connected_mcp_client() or await get_mcp_client()
+    async for frame in client.stream_user_query_ndjson(user_query, client_id):
+        yield frame
+
 async def get_patient_data_with_mcp(patient_name: str) -> Dict[str, Any]:
     """Get patient data using MCP"""
-    client = await get_mcp_client()
+    client = _connected_mcp_client() or await get_mcp_client()
     return await client.get_patient_data(patient_name)
 
 async def get_patient_summary_with_mcp(patient_name: str, summary_type: str = "comprehensive") -> Dict[str, Any]:
     """Get patient summary using MCP"""
-    client = await get_mcp_client()
+    client = _connected_mcp_client() or await get_mcp_client()
     return await client.get_patient_summary(patient_name, summary_type)
 
 async def check_medication_interactions_with_mcp(new_medications: List[str], existing_medications: List[str]) -> Dict[str, Any]:
     """Check medication interactions using MCP"""
-    client = await get_mcp_client()
+    client = _connected_mcp_client() or await get_mcp_client()
     return await client.check_medication_interactions(new_medications, existing_medications)
@@ -4,216 +4,280 @@ MCP Configuration for Clinical Assistant
 Configuration settings for MCP server and client
 """
 
+import json
+import logging
 import os
-from typing import Dict, List, Any
+from dataclasses import dataclass, field
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Any, Callable, Dict, List, Mapping, Tuple
 
-class MCPConfig:
-    """Configuration class for MCP Clinical Assistant"""
-    
-    def __init__(self):
-        self.server_name = "clinical-assistant"
-        self.server_version = "1.0.0"
-        self.server_description = "Clinical Assistant MCP Server for patient data management"
-        
-        # MCP Server Configuration
-        self.server_config = {
-            "name": self.server_name,
-            "version": self.server_version,
-            "description": self.server_description,
-            "capabilities": {
-                "tools": True,
-                "resources": True,
-                "prompts": False,
-                "logging": True
-            }
-        }
-        
-        # Tool Definitions
-        self.tools = [
-            {
-                "name": "get_patient_data",
-                "description": "Retrieve raw patient medical records from Elasticsearch",
-                "input_schema": {
-                    "type": "object",
-                    "properties": {
-                        "patient_name": {
-                            "type": "string",
-                            "description": "Full name of the patient to retrieve records for"
-                        }
-                    },
-                    "required": ["patient_name"]
+logger = logging.getLogger(__name__)
+
+# Environment variables the Elasticsearch-backed tools cannot run without
+_REQUIRED_ENV = ("ELASTIC_URL", "ELASTIC_API_KEY", "ELASTIC_INDEX_NAME")
+
+# Tools left out of the up-front tool list sent to the LLM; they are found on demand through search_tools
+DEFERRED_TOOLS = {"summarize_patient_data"}
+
+# Tool Definitions
+_TOOL_DEFINITIONS = [
+    {
+        "name": "get_patient_data",
+        "description": "Retrieve raw patient medical records from Elasticsearch",
+        "input_schema": {
+            "type": "object",
+            "properties": {
+                "patient_name": {
+                    "type": "string",
+                    "description": "Full name of the patient to retrieve records for"
                 }
             },
-            {
-                "name": "summarize_patient_data",
-                "description": "Analyze and summarize patient medical data",
-                "input_schema": {
+            "required": ["patient_name"]
+        }
+    },
+    {
+        "name": "summarize_patient_data",
+        "description": "Analyze and summarize patient medical data",
+        "input_schema": {
+            "type": "object",
+            "properties": {
+                "patient_data": {
                     "type": "object",
-                    "properties": {
-                        "patient_data": {
-                            "type": "object",
-                            "description": "Raw patient data from get_patient_data"
-                        },
-                        "summary_type": {
-                            "type": "string",
-                            "enum": ["comprehensive", "medication_focus", "recent_visits", "risk_assessment", "treatment_history"],
-                            "description": "Type of summary to generate",
-                            "default": "comprehensive"
-                        }
-                    },
-                    "required": ["patient_data", "summary_type"]
+                    "description": "Raw patient data from get_patient_data"
+                },
+                "summary_type": {
+                    "type": "string",
+                    "enum": ["comprehensive", "medication_focus", "recent_visits", "risk_assessment", "treatment_history"],
+                    "description": "Type of summary to generate",
+                    "default": "comprehensive"
                 }
             },
-            {
-                "name": "get_patient_summary",
-                "description": "Convenience tool that combines data retrieval and summarization",
-                "input_schema": {
-                    "type": "object",
-                    "properties": {
-                        "patient_name": {
-                            "type": "string",
-                            "description": "Full name of the patient"
-                        },
-                        "summary_type": {
-                            "type": "string",
-                            "enum": ["comprehensive", "medication_focus", "recent_visits", "risk_assessment", "treatment_history"],
-                            "description": "Type of summary to generate",
-                            "default": "comprehensive"
-                        }
-                    },
-                    "required": ["patient_name"]
+            "required": ["patient_data", "summary_type"]
+        }
+    },
+    {
+        "name": "get_patient_summary",
+        "description": "Convenience tool that combines data retrieval and summarization",
+        "input_schema": {
+            "type": "object",
+            "properties": {
+                "patient_name": {
+                    "type": "string",
+                    "description": "Full name of the patient"
+                },
+                "summary_type": {
+                    "type": "string",
+                    "enum": ["comprehensive", "medication_focus", "recent_visits", "risk_assessment", "treatment_history"],
+                    "description": "Type of summary to generate",
+                    "default": "comprehensive"
                 }
             },
-            {
-                "name": "check_medication_interactions",
-                "description": "Check for potential drug interactions between medications",
-                "input_schema": {
-                    "type": "object",
-                    "properties": {
-                        "new_medications": {
-                            "type": "array",
-                            "items": {"type": "string"},
-                            "description": "List of new medications being considered"
-                        },
-                        "existing_medications": {
-                            "type": "array",
-                            "items": {"type": "string"},
-                            "description": "List of patient's current medications"
-                        }
-                    },
-                    "required": ["new_medications", "existing_medications"]
+            "required": ["patient_name"]
+        }
+    },
+    {
+        "name": "check_medication_interactions",
+        "description": "Check for potential drug interactions between medications",
+        "input_schema": {
+            "type": "object",
+            "properties": {
+                "new_medications": {
+                    "type": "array",
+                    "items": {"type": "string"},
+                    "description": "List of new medications being considered"
+                },
+                "existing_medications": {
+                    "type": "array",
+                    "items": {"type": "string"},
+                    "description": "List of patient's current medications"
                 }
-            }
-        ]
-        
-        # Resource Definitions
-        self.resources = [
-            {
-                "uri": "patient_database://elasticsearch",
-                "name": "Patient Database",
-                "description": "Elasticsearch database containing patient medical records",
-                "mimeType": "application/json"
             },
-            {
-                "uri": "drug_interactions://database",
-                "name": "Drug Interactions Database",
-                "description": "Database of known drug interactions",
-                "mimeType": "application/json"
-            }
-        ]
-        
-        # Streaming Configuration
-        self.streaming_config = {
-            "enabled": True,
-            "chunk_size": 1024,
-            "timeout": 30,
-            "max_retries": 3,
-            "retry_delay": 1.0
-        }
-        
-        # Logging Configuration
-        self.logging_config = {
-            "level": os.getenv("MCP_LOG_LEVEL", "INFO"),
-            "format": "%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-            "file": os.getenv("MCP_LOG_FILE", "mcp_server.log")
-        }
-        
-        # Performance Configuration
-        self.performance_config = {
-            "max_concurrent_requests": int(os.getenv("MCP_MAX_CONCURRENT", "10")),
-            "request_timeout": int(os.getenv("MCP_REQUEST_TIMEOUT", "30")),
-            "cache_size": int(os.getenv("MCP_CACHE_SIZE", "100")),
-            "cache_ttl": int(os.getenv("MCP_CACHE_TTL", "300"))  # 5 minutes
-        }
-        
-        # Security Configuration
-        self.security_config = {
-            "enable_auth": os.getenv("MCP_ENABLE_AUTH", "false").lower() == "true",
-            "api_key": os.getenv("MCP_API_KEY"),
-            "allowed_origins": os.getenv("MCP_ALLOWED_ORIGINS", "*").split(","),
-            "rate_limit": int(os.getenv("MCP_RATE_LIMIT", "100"))  # requests per minute
+            "required": ["new_medications", "existing_medications"]
         }
+    }
+]
+
+# Resource Definitions
+_RESOURCE_DEFINITIONS = [
+    {
+        "uri": "patient_database://elasticsearch",
+        "name": "Patient Database",
+        "description": "Elasticsearch database containing patient medical records",
+        "mimeType": "application/json"
+    },
+    {
+        "uri": "drug_interactions://database",
+        "name": "Drug Interactions Database",
+        "description": "Database of known drug interactions",
+        "mimeType": "application/json"
+    }
+]
+
+# Frozen views of the definitions above, plus the tool list pre-encoded as compact JSON for the wire
+_TOOLS_JSON_BYTES = json.dumps(_TOOL_DEFINITIONS, separators=(",", ":")).encode()
+_TOOLS_TUPLE = tuple(MappingProxyType(tool) for tool in _TOOL_DEFINITIONS)
+_RESOURCES_TUPLE = tuple(MappingProxyType(resource) for resource in _RESOURCE_DEFINITIONS)
+
+# Tool name -> argument validator compiled from its input_schema; empty when fastjsonschema isn't installed.
+# Validators raise fastjsonschema.JsonSchemaException (a ValueError) and return the arguments with defaults filled in.
+try:
+    import fastjsonschema
+    TOOL_VALIDATORS: Mapping[str, Callable[[Any], Any]] = MappingProxyType({
+        tool["name"]: fastjsonschema.compile(tool["input_schema"]) for tool in _TOOL_DEFINITIONS
+    })
+except ImportError:
+    TOOL_VALIDATORS = MappingProxyType({})
+
+# Capabilities advertised in the server configuration
+_SERVER_CAPABILITIES = MappingProxyType({
+    "tools": True,
+    "resources": True,
+    "prompts": False,
+    "logging": True
+})
+
+
+def _streaming_config() -> Mapping[str, Any]:
+    """Streaming Configuration"""
+    return MappingProxyType({
+        "enabled": True,
+        "chunk_size": 1024,
+        "timeout": 30,
+        "max_retries": 3,
+        "retry_delay": 1.0
+    })
+
+
+def _logging_config() -> Mapping[str, Any]:
+    """Logging Configuration"""
+    return MappingProxyType({
+        "level": os.getenv("MCP_LOG_LEVEL", "INFO"),
+        "format": "%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+        "file": os.getenv("MCP_LOG_FILE", "mcp_server.log")
+    })
+
+
+def _performance_config() -> Mapping[str, Any]:
+    """Performance Configuration"""
+    return MappingProxyType({
+        "max_concurrent_requests": int(os.getenv("MCP_MAX_CONCURRENT", "10")),
+        "request_timeout": int(os.getenv("MCP_REQUEST_TIMEOUT", "30")),
+        "cache_size": int(os.getenv("MCP_CACHE_SIZE", "100")),
+        "cache_ttl": int(os.getenv("MCP_CACHE_TTL", "300"))  # 5 minutes
+    })
+
+
+def _security_config() -> Mapping[str, Any]:
+    """Security Configuration"""
+    return MappingProxyType({
+        "enable_auth": os.getenv("MCP_ENABLE_AUTH", "false").lower() == "true",
+        "api_key": os.getenv("MCP_API_KEY"),
+        "allowed_origins": tuple(os.getenv("MCP_ALLOWED_ORIGINS", "*").split(",")),
+        "rate_limit": int(os.getenv("MCP_RATE_LIMIT", "100"))  # requests per minute
+    })
+
+
+def _thaw(value: Any) -> Any:
+    """Copy a frozen config value into plain dicts and lists, which callers may change or pass to json.dumps"""
+    if isinstance(value, Mapping):
+        return {key: _thaw(item) for key, item in value.items()}
+    if isinstance(value, tuple):
+        return [_thaw(item) for item in value]
+    return value
+
+
+# Identity equality (as before the dataclass) keeps instances hashable for the validation memo below
+@dataclass(frozen=True, slots=True, eq=False)
+class MCPConfig:
+    """Configuration class for MCP Clinical Assistant, built once and shared read-only"""
     
+    server_name: str = "clinical-assistant"
+    server_version: str = "1.0.0"
+    server_description: str = "Clinical Assistant MCP Server for patient data management"
+    tools: Tuple[Mapping[str, Any], ...] = _TOOLS_TUPLE
+    resources: Tuple[Mapping[str, Any], ...] = _RESOURCES_TUPLE
+    streaming_config: Mapping[str, Any] = field(default_factory=_streaming_config)
+    logging_config: Mapping[str, Any] = field(default_factory=_logging_config)
+    performance_config: Mapping[str, Any] = field(default_factory=_performance_config)
+    security_config: Mapping[str, Any] = field(default_factory=_security_config)
+    
+    @property
+    def server_config(self) -> Mapping[str, Any]:
+        """MCP Server Configuration"""
+        return MappingProxyType({
+            "name": self.server_name,
+            "version": self.server_version,
+            "description": self.server_description,
+            "capabilities": _SERVER_CAPABILITIES
+        })
+    
+    # The getters hand out plain copies, so callers can't change the shared configuration
     def get_server_config(self) -> Dict[str, Any]:
         """Get server configuration"""
-        return self.server_config
+        return _thaw(self.server_config)
     
     def get_tools(self) -> List[Dict[str, Any]]:
         """Get tool definitions"""
-        return self.tools
+        return _thaw(self.tools)
+    
+    def get_tools_json_bytes(self) -> bytes:
+        """Get tool definitions encoded as compact JSON"""
+        return _TOOLS_JSON_BYTES
     
     def get_resources(self) -> List[Dict[str, Any]]:
         """Get resource definitions"""
-        return self.resources
+        return _thaw(self.resources)
     
     def get_streaming_config(self) -> Dict[str, Any]:
         """Get streaming configuration"""
-        return self.streaming_config
+        return _thaw(self.streaming_config)
     
     def get_logging_config(self) -> Dict[str, Any]:
         """Get logging configuration"""
-        return self.logging_config
+        return _thaw(self.logging_config)
     
     def get_performance_config(self) -> Dict[str, Any]:
         """Get performance configuration"""
-        return self.performance_config
+        return _thaw(self.performance_config)
     
     def get_security_config(self) -> Dict[str, Any]:
         """Get security configuration"""
-        return self.security_config
+        return _thaw(self.security_config)
     
     def validate_config(self) -> bool:
-        """Validate configuration"""
+        """Validate configuration (result is memoized after the first call)"""
         try:
-            # Check required environment variables
-            required_env_vars = [
-                "ELASTIC_URL",
-                "ELASTIC_API_KEY", 
-                "ELASTIC_INDEX_NAME"
-            ]
-            
-            for var in required_env_vars:
-                if not os.getenv(var):
-                    print(f"Warning: Required environment variable {var} not set")
-            
-            # Validate tool definitions
-            for tool in self.tools:
-                if not tool.get("name") or not tool.get("description"):
-                    print(f"Invalid tool definition: {tool}")
-                    return False
-            
-            # Validate resource definitions
-            for resource in self.resources:
-                if not resource.get("uri") or not resource.get("name"):
-                    print(f"Invalid resource definition: {resource}")
-                    return False
-            
-            return True
-            
+            return _validate_config(self)
         except Exception as e:
-            print(f"Configuration validation error: {e}")
+            logger.error("Configuration validation error: %s", e)
             return False
 
+
+@lru_cache(maxsize=8)
+def _validate_config(config: MCPConfig) -> bool:
+    """Validate a configuration once; memoized here since the instance itself is frozen"""
+    # Check required environment variables
+    missing = [var for var in _REQUIRED_ENV if not os.environ.get(var)]
+    if missing:
+        logger.warning("Required environment variables not set: %s", missing)
+    
+    # Validate tool definitions
+    invalid_tool = next((tool for tool in config.tools
+                         if not tool.get("name") or not tool.get("description")), None)
+    if invalid_tool is not None:
+        logger.error("Invalid tool definition: %s", invalid_tool)
+        return False
+    
+    # Validate resource definitions
+    invalid_resource = next((resource for resource in config.resources
+                             if not resource.get("uri") or not resource.get("name")), None)
+    if invalid_resource is not None:
+        logger.error("Invalid resource definition: %s", invalid_resource)
+        return False
+    
+    return True
+
 # Global configuration instance
 config = MCPConfig()
 
@@ -5,17 +5,28 @@ Provides streaming HTTP tools for patient data retrieval and analysis
 """
 
 import asyncio
+import heapq
 import json
 import logging
-from typing import Dict, List, Any, AsyncGenerator
-from datetime import datetime, timedelta
+import mmap
+import re
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from itertools import combinations
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Dict, List, Any, AsyncGenerator, Mapping, Optional
+from datetime import date
 import os
 import sys
 
 # Add the current directory to Python path to import from app.py
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from elasticsearch import Elasticsearch
+import numpy as np
+from cachetools import TTLCache
+from elasticsearch import AsyncElasticsearch
+from elasticsearch.helpers import async_scan
 from mcp.server import Server
 from mcp.server.stdio import stdio_server
 
@@ -23,59 +34,249 @@ from mcp.server.stdio import stdio_server
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Fast JSON decoding of bytes-like buffers; falls back to the stdlib when orjson isn't installed
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    def _json_loads(data) -> Any:
+        return json.loads(bytes(data))
+
+# Diagnosis keyword -> preventive recommendation, in the order recommendations are listed
+PREVENTIVE_RECOMMENDATIONS = (
+    ("BPPV", "Consider vestibular rehabilitation exercises"),
+    ("GERD", "Maintain dietary modifications for GERD management"),
+)
+PREVENTIVE_KEYWORD_PATTERN = re.compile("|".join(re.escape(keyword) for keyword, _ in PREVENTIVE_RECOMMENDATIONS))
+
+# HTTP connections kept per Elasticsearch node, sized so concurrent tool calls don't queue on the pool
+ES_CONNECTIONS_PER_NODE = int(os.environ.get('ES_CONNECTIONS_PER_NODE', '64'))
+
+# Patient data cache bounds; entries expire after the TTL, in seconds
+PATIENT_CACHE_SIZE = 1024
+PATIENT_CACHE_TTL = 60
+
+# Hits fetched per search/scroll page, and records per partial chunk streamed to the caller
+SCAN_PAGE_SIZE = 200
+PARTIAL_PAGE_SIZE = 50
+
+# How long a patient search waits for others to share its msearch round trip, in seconds
+MSEARCH_WINDOW = 0.005
+# Max searches sent in one msearch request
+MSEARCH_MAX_BATCH = 32
+
+@dataclass(slots=True)
+class RecordsDigest:
+    """Per-record-list aggregates computed in one pass and shared by the summary helpers"""
+    records: List[dict]
+    diagnoses: List[str]  # Non-empty diagnoses, in record order
+    diagnosis_counts: Counter
+    medication_counts: Counter
+    sorted_desc: Optional[List[dict]] = None  # Records sorted by date_of_visit, newest first; filled in on first use
+    diagnosis_positions: Optional[Dict[str, List[int]]] = None  # Diagnosis -> positions in sorted_desc; filled in on first use
+    visit_dates: Optional[np.ndarray] = None  # Parsed visit dates as datetime64[D]; filled in on first use
+
+def visit_date_key(record: dict) -> str:
+    """Sort key ordering records by visit date; ISO date strings already sort chronologically"""
+    return record.get('date_of_visit') or ''
+
+# Shape of a YYYY-MM-DD visit date with an in-range month and day; anything else (e.g. "3-DAYS-AGO")
+# is left out of date math without raising
+VISIT_DATE_PATTERN = re.compile(r"\d{4}-(?:0[1-9]|1[0-2])-(?:0[1-9]|[12]\d|3[01])")
+
+def parse_visit_date(date_str: Optional[str]) -> Optional[date]:
+    """Parse a YYYY-MM-DD visit date, returning None for missing or malformed values"""
+    if not date_str:
+        return None
+    try:
+        return date.fromisoformat(date_str)
+    except ValueError:
+        return None
+
+# Fields fetched for each patient record, and a record with all of them unset
+PATIENT_SOURCE_FIELDS = (
+    "date_of_visit",
+    "patient_complaint",
+    "diagnosis",
+    "doctor_notes",
+    "drugs_prescribed",
+    "patient_age_at_visit",
+    "patient_name"
+)
+EMPTY_PATIENT_RECORD = MappingProxyType(dict.fromkeys(PATIENT_SOURCE_FIELDS))
+
+def record_from_hit(hit: dict) -> dict:
+    """Get the patient record from a search hit"""
+    source = hit.get('_source', {})
+    # _source is already filtered to PATIENT_SOURCE_FIELDS, so it is used as is unless a field is missing
+    if len(source) == len(PATIENT_SOURCE_FIELDS):
+        return source
+    return {**EMPTY_PATIENT_RECORD, **source}
+
+class PatientSearchBatcher:
+    """Coalesces patient searches arriving within a short window into a single msearch request"""
+    
+    def __init__(self, elastic_client: AsyncElasticsearch, index_name: str):
+        self.elastic_client = elastic_client
+        self.index_name = index_name
+        self.pending: List[tuple] = []  # (msearch header, search body, future awaiting its response)
+        self.flush_task = None
+        self.tasks = set()  # Strong references to scheduled flushes and sends; the loop only keeps weak ones
+    
+    async def search(self, body: dict, **header) -> dict:
+        """Queue a search and wait for its response from the next msearch batch.
+        Keyword arguments go in the search's msearch header (e.g. preference, request_cache)."""
+        future = asyncio.get_running_loop().create_future()
+        self.pending.append(({"index": self.index_name, **header}, body, future))
+        if len(self.pending) >= MSEARCH_MAX_BATCH:
+            self.flush()
+        elif self.flush_task is None:
+            self.flush_task = self.spawn(self.flush_after_window())
+        return await future
+    
+    async def flush_after_window(self):
+        await asyncio.sleep(MSEARCH_WINDOW)
+        self.flush_task = None
+        self.flush()
+    
+    def flush(self):
+        """Send every pending search as one msearch request"""
+        batch, self.pending = self.pending, []
+        if self.flush_task is not None:
+            self.flush_task.cancel()
+            self.flush_task = None
+        if batch:
+            self.spawn(self.send(batch))
+    
+    def spawn(self, coro) -> asyncio.Task:
+        """Start a task and keep it referenced until it finishes"""
+        task = asyncio.create_task(coro)
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        return task
+    
+    async def send(self, batch: List[tuple]):
+        searches = []
+        for header, body, _ in batch:
+            searches.append(header)
+            searches.append(body)
+        try:
+            response = await self.elastic_client.msearch(searches=searches)
+            responses = response.body["responses"] if hasattr(response, 'body') else response["responses"]
+        except Exception as e:
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        
+        for (_, _, future), item in zip(batch, responses):
+            if future.done():
+                continue
+            if "error" in item:
+                future.set_exception(RuntimeError(f"Search failed: {item['error']}"))
+            else:
+                future.set_result(item)
+        # Never leave a caller waiting if the response came back short
+        for _, _, future in batch[len(responses):]:
+            if not future.done():
+                future.set_exception(RuntimeError(f"msearch returned {len(responses)} responses for {len(batch)} searches"))
+
 class ClinicalMCPServer:
     def __init__(self):
         self.server = Server("clinical-assistant")
         self.elastic_client = None
         self.elastic_index_name = None
+        self.patient_search_batcher = None
+        self.patient_cache = TTLCache(maxsize=PATIENT_CACHE_SIZE, ttl=PATIENT_CACHE_TTL)  # Lowercased name -> patient data
+        self.patient_fetches: Dict[str, asyncio.Task] = {}  # Lowercased name -> task fetching that patient's records
+        self.digest_cache = TTLCache(maxsize=PATIENT_CACHE_SIZE, ttl=PATIENT_CACHE_TTL)  # Lowercased name -> digest of cached records
         self.drug_interactions = {}
+        self.interaction_pairs: Mapping[frozenset, str] = {}  # {drug, drug} -> interaction message
         self.setup_elasticsearch()
         self.load_drug_interactions()
         self.setup_tools()
     
     def setup_elasticsearch(self):
-        """Initialize Elasticsearch connection"""
+        """Create the shared async Elasticsearch client; the connection is checked in connect_elasticsearch"""
         elastic_url = os.environ.get('ELASTIC_URL')
         elastic_api_key = os.environ.get('ELASTIC_API_KEY')
         self.elastic_index_name = os.environ.get('ELASTIC_INDEX_NAME')
         
         if elastic_url and elastic_api_key:
             try:
-                self.elastic_client = Elasticsearch(
+                self.elastic_client = AsyncElasticsearch(
                     hosts=[elastic_url],
                     api_key=elastic_api_key,
-                    verify_certs=True
+                    verify_certs=True,
+                    connections_per_node=ES_CONNECTIONS_PER_NODE,
+                    http_compress=True  # doctor_notes text compresses well; also applies to scan pages
                 )
-                if self.elastic_client.ping():
-                    logger.info("Elasticsearch connection successful!")
-                else:
-                    logger.error("Elasticsearch connection failed!")
-                    self.elastic_client = None
+                if self.elastic_index_name:
+                    self.patient_search_batcher = PatientSearchBatcher(self.elastic_client, self.elastic_index_name)
             except Exception as e:
                 logger.error(f"Failed to initialize Elasticsearch client: {e}")
                 self.elastic_client = None
         else:
             logger.warning("Elasticsearch credentials not configured")
     
+    async def connect_elasticsearch(self):
+        """Check the Elasticsearch connection, dropping the client if it can't be reached"""
+        if not self.elastic_client:
+            return
+        try:
+            if await self.elastic_client.ping():
+                logger.info("Elasticsearch connection successful!")
+                return
+            logger.error("Elasticsearch connection failed!")
+        except Exception as e:
+            logger.error(f"Failed to connect to Elasticsearch: {e}")
+        await self.elastic_client.close()
+        self.elastic_client = None
+        self.patient_search_batcher = None
+    
+    async def close_elasticsearch(self):
+        """Close the shared Elasticsearch client"""
+        if self.elastic_client:
+            await self.elastic_client.close()
+            self.elastic_client = None
+            self.patient_search_batcher = None
+    
     def load_drug_interactions(self):
         """Load drug interactions data"""
         try:
-            with open('data/drug-interactions-data.json', 'r') as f:
-                interactions_data = json.load(f)
+            # Parse straight from the mapped file instead of reading a copy into memory first
+            with open('data/drug-interactions-data.json', 'rb') as f, \
+                    mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf, memoryview(buf) as view:
+                interactions_data = _json_loads(view)
             
             # Convert to the format expected by the existing code
+            drug_interactions = {}
+            interaction_pairs = {}
             for item in interactions_data:
-                primary_drug = item['primary_drug']
+                primary_drug = sys.intern(item['primary_drug'])
                 negative_interactions = item['negative_drug_interactions']
                 
-                if primary_drug not in self.drug_interactions:
-                    self.drug_interactions[primary_drug] = {}
+                if primary_drug not in drug_interactions:
+                    drug_interactions[primary_drug] = {}
                 
                 for interaction_drug in negative_interactions:
                     if interaction_drug != "None":
-                        self.drug_interactions[primary_drug][interaction_drug] = f"⚠️ INTERACTION: Potential interaction between {primary_drug} and {interaction_drug}."
+                        interaction_drug = sys.intern(interaction_drug)
+                        # Interactions go both ways, so index by the unordered pair and under both drugs
+                        message = interaction_pairs.setdefault(
+                            frozenset((primary_drug, interaction_drug)),
+                            f"⚠️ INTERACTION: Potential interaction between {primary_drug} and {interaction_drug}."
+                        )
+                        drug_interactions[primary_drug][interaction_drug] = message
+                        drug_interactions.setdefault(interaction_drug, {})[primary_drug] = message
+            
+            # Shared read-only from here on
+            self.drug_interactions = MappingProxyType({
+                drug: MappingProxyType(partners) for drug, partners in drug_interactions.items()
+            })
+            self.interaction_pairs = MappingProxyType(interaction_pairs)
             
-            logger.info(f"Loaded {len(self.drug_interactions)} drug interaction entries")
+            logger.info(f"Loaded {len(self.interaction_pairs)} drug interaction pairs covering {len(self.drug_interactions)} drugs")
         except Exception as e:
             logger.error(f"Failed to load drug interactions: {e}")
     
@@ -123,12 +324,8 @@ class ClinicalMCPServer:
                 patient_name: Full name of the patient
                 summary_type: Type of summary to generate
             """
-            # First get the data
-            patient_data = None
-            async for chunk in self.stream_patient_data(patient_name):
-                if chunk.get("status") == "complete":
-                    patient_data = chunk.get("data")
-                    break
+            # First get the data, shared with get_patient_data through the patient cache
+            patient_data = await self.fetch_patient_data(patient_name)
             
             if patient_data and patient_data.get("success"):
                 # Then summarize it
@@ -152,66 +349,68 @@ class ClinicalMCPServer:
             async for chunk in self.stream_drug_interaction_check(new_medications, existing_medications):
                 yield chunk
     
-    async def stream_patient_data(self, patient_name: str) -> AsyncGenerator[Dict[str, Any], None]:
-        """Stream patient data retrieval from Elasticsearch"""
+    async def stream_patient_data(self, patient_name: str, aggregate: bool = False) -> AsyncGenerator[Dict[str, Any], None]:
+        """Stream patient data retrieval from Elasticsearch, yielding records in partial pages as they arrive.
+        With aggregate set, the complete chunk also carries every record, for callers that need the whole set."""
         logger.info(f"Querying patient data for: '{patient_name}'")
         
         yield {"status": "searching", "message": f"Looking up patient: {patient_name}"}
         
-        if not self.elastic_client or not self.elastic_index_name:
+        if not self.patient_search_batcher:
             yield {"status": "error", "message": "Elasticsearch client not configured"}
             return
         
+        cache_key = patient_name.strip().lower()
         try:
-            # Use a simpler query structure that's more compatible with standard Elasticsearch
-            query = {
-                "query": {
-                    "match": {
-                        "patient_name": patient_name
-                    }
-                },
-                "_source": [
-                    "date_of_visit",
-                    "patient_complaint", 
-                    "diagnosis",
-                    "doctor_notes",
-                    "drugs_prescribed",
-                    "patient_age_at_visit",
-                    "patient_name"
-                ]
-            }
+            result = self.patient_cache.get(cache_key)
+            if result is None:
+                fetch = self.patient_fetches.get(cache_key)
+                if fetch is None:
+                    # This request leads the lookup and streams pages as the fetch produces them. The fetch
+                    # runs in its own task, so a caller that goes away mid-stream doesn't hold up the others.
+                    pages: asyncio.Queue = asyncio.Queue()
+                    fetch = self.start_patient_fetch(cache_key, patient_name, pages)
+                    yield {"status": "querying", "message": "Searching Elasticsearch database..."}
+                    
+                    received = 0
+                    while True:
+                        page = await pages.get()
+                        if page is None:
+                            break
+                        received += len(page)
+                        yield {"status": "partial", "records": page, "message": f"Received {received} records..."}
+                # Concurrent misses for one patient wait for the same fetch and share its result
+                result = await asyncio.shield(fetch)
             
-            yield {"status": "querying", "message": "Searching Elasticsearch database..."}
+            data = result if aggregate else {key: value for key, value in result.items() if key != "records"}
+            yield {"status": "complete", "data": data, "message": f"Found {result['total_records']} records for {patient_name}"}
             
-            # Execute the search
-            response = self.elastic_client.search(
-                index=self.elastic_index_name,
-                body=query
-            )
-            
-            # Convert response to dictionary if it's an ObjectApiResponse
-            if hasattr(response, 'body'):
-                response_dict = response.body
-            else:
-                response_dict = response
-            
-            # Extract and format the results
-            hits = response_dict.get('hits', {}).get('hits', [])
+        except Exception as e:
+            logger.error(f"Error querying patient data: {str(e)}")
+            yield {"status": "error", "message": f"Failed to query patient data: {str(e)}"}
+    
+    def start_patient_fetch(self, cache_key: str, patient_name: str, pages: asyncio.Queue) -> asyncio.Task:
+        """Start fetching a patient's records in a task registered in patient_fetches until it finishes"""
+        fetch = asyncio.create_task(self.fetch_patient_records(cache_key, patient_name, pages))
+        self.patient_fetches[cache_key] = fetch
+        
+        def done(finished: asyncio.Task):
+            if self.patient_fetches.get(cache_key) is finished:
+                del self.patient_fetches[cache_key]
+            if not finished.cancelled():
+                finished.exception()  # Mark as retrieved so it isn't logged when every caller has gone
+        
+        fetch.add_done_callback(done)
+        return fetch
+    
+    async def fetch_patient_records(self, cache_key: str, patient_name: str, pages: asyncio.Queue) -> dict:
+        """Fetch all of a patient's records and cache the result, putting each page on pages as it arrives
+        and None once the fetch ends"""
+        try:
             patient_records = []
-            
-            yield {"status": "processing", "message": f"Processing {len(hits)} records..."}
-            
-            for hit in hits:
-                source = hit.get('_source', {})
-                patient_records.append({
-                    'date_of_visit': source.get('date_of_visit'),
-                    'patient_complaint': source.get('patient_complaint'),
-                    'diagnosis': source.get('diagnosis'),
-                    'doctor_notes': source.get('doctor_notes'),
-                    'drugs_prescribed': source.get('drugs_prescribed'),
-                    'patient_age_at_visit': source.get('patient_age_at_visit'),
-                    'patient_name': source.get('patient_name')
-                })
+            async for page in self.iter_patient_record_pages(patient_name):
+                patient_records.extend(page)
+                pages.put_nowait(page)
             
             result = {
                 "success": True,
@@ -219,12 +418,62 @@ class ClinicalMCPServer:
                 "total_records": len(patient_records),
                 "records": patient_records
             }
-            
-            yield {"status": "complete", "data": result, "message": f"Found {len(patient_records)} records for {patient_name}"}
-            
-        except Exception as e:
-            logger.error(f"Error querying patient data: {str(e)}")
-            yield {"status": "error", "message": f"Failed to query patient data: {str(e)}"}
+            self.patient_cache[cache_key] = result
+            return result
+        finally:
+            pages.put_nowait(None)
+    
+    async def fetch_patient_data(self, patient_name: str) -> Optional[dict]:
+        """Get a patient's complete data, from the cache when possible; None if the lookup failed"""
+        result = self.patient_cache.get(patient_name.strip().lower())
+        if result is not None:
+            return result
+        async for chunk in self.stream_patient_data(patient_name, aggregate=True):
+            if chunk.get("status") == "complete":
+                return chunk.get("data")
+        return None
+    
+    async def iter_patient_record_pages(self, patient_name: str) -> AsyncGenerator[List[dict], None]:
+        """Yield a patient's records in pages. The first page goes through the msearch batcher;
+        patients with more records than fit in it are scanned in full, skipping hits already yielded."""
+        # Exact name lookup as an unscored keyword filter, falling back to an analyzed match
+        # (case-insensitive, partial names) when the exact lookup finds nothing
+        name_queries = (
+            {"bool": {"filter": [{"term": {"patient_name.keyword": patient_name}}]}},
+            {"match": {"patient_name": {"query": patient_name, "operator": "and"}}}
+        )
+        
+        # Repeat lookups for a patient go to the same shard copies and can be served from the shard request cache
+        preference = patient_name.strip().lower()
+        
+        for name_query in name_queries:
+            query = {"query": name_query, "_source": PATIENT_SOURCE_FIELDS}
+            # Execute the search, batched with concurrent lookups into one msearch
+            response_dict = await self.patient_search_batcher.search(
+                {**query, "size": SCAN_PAGE_SIZE, "track_total_hits": False, "sort": ["_doc"]},
+                request_cache=True, preference=preference
+            )
+            if response_dict.get('hits', {}).get('hits'):
+                break
+        
+        hits = response_dict.get('hits', {}).get('hits', [])
+        for start in range(0, len(hits), PARTIAL_PAGE_SIZE):
+            yield [record_from_hit(hit) for hit in hits[start:start + PARTIAL_PAGE_SIZE]]
+        if len(hits) < SCAN_PAGE_SIZE:
+            return
+        
+        seen_ids = {hit.get('_id') for hit in hits}
+        page = []
+        async for hit in async_scan(self.elastic_client, index=self.elastic_index_name, query=query,
+                                    size=SCAN_PAGE_SIZE, preference=preference):
+            if hit.get('_id') in seen_ids:
+                continue
+            page.append(record_from_hit(hit))
+            if len(page) >= PARTIAL_PAGE_SIZE:
+                yield page
+                page = []
+        if page:
+            yield page
     
     async def stream_patient_summary(self, patient_data: dict, summary_type: str) -> AsyncGenerator[Dict[str, Any], None]:
         """Stream patient data summarization"""
@@ -258,70 +507,66 @@ class ClinicalMCPServer:
     
     async def create_comprehensive_summary(self, patient_data: dict) -> dict:
         """Create comprehensive patient summary"""
-        records = patient_data.get("records", [])
+        digest = self.get_digest(patient_data)
         
         summary = {
             "patient_overview": {
                 "name": patient_data.get("patient_name"),
                 "total_visits": patient_data.get("total_records"),
-                "age_range": self.calculate_age_range(records),
-                "primary_conditions": self.identify_primary_conditions(records)
+                "age_range": self.calculate_age_range(digest),
+                "primary_conditions": self.identify_primary_conditions(digest)
             },
-            "medication_history": self.analyze_medications(records),
-            "recent_visits": self.get_recent_visits(records),
-            "clinical_patterns": self.identify_patterns(records),
-            "risk_factors": self.assess_risks(records)
+            "medication_history": self.analyze_medications(digest),
+            "recent_visits": self.get_recent_visits(digest),
+            "clinical_patterns": self.identify_patterns(digest),
+            "risk_factors": self.assess_risks(digest)
         }
         return summary
     
     async def create_medication_summary(self, patient_data: dict) -> dict:
         """Create medication-focused summary"""
-        records = patient_data.get("records", [])
+        digest = self.get_digest(patient_data)
         
         summary = {
-            "medication_history": self.analyze_medications(records),
-            "current_medications": self.get_current_medications(records),
-            "medication_timeline": self.create_medication_timeline(records),
-            "interaction_risks": self.assess_medication_risks(records)
+            "medication_history": self.analyze_medications(digest),
+            "current_medications": self.get_current_medications(digest),
+            "medication_timeline": self.create_medication_timeline(digest),
+            "interaction_risks": self.assess_medication_risks(digest)
         }
         return summary
     
     async def create_recent_visits_summary(self, patient_data: dict) -> dict:
         """Create recent visits summary"""
-        records = patient_data.get("records", [])
-        
-        # Sort by date and get recent visits
-        sorted_records = sorted(records, key=lambda x: x.get('date_of_visit', ''), reverse=True)
-        recent_records = sorted_records[:3]  # Last 3 visits
+        digest = self.get_digest(patient_data)
         
         summary = {
-            "recent_visits": recent_records,
-            "visit_frequency": self.calculate_visit_frequency(records),
-            "trending_conditions": self.identify_trending_conditions(records)
+            "recent_visits": self.get_recent_visits(digest),  # Last 3 visits
+            "visit_frequency": self.calculate_visit_frequency(digest),
+            "trending_conditions": self.identify_trending_conditions(digest)
         }
         return summary
     
     async def create_risk_assessment(self, patient_data: dict) -> dict:
         """Create risk assessment summary"""
-        records = patient_data.get("records", [])
+        digest = self.get_digest(patient_data)
         
         summary = {
-            "health_risks": self.assess_risks(records),
-            "medication_risks": self.assess_medication_risks(records),
-            "chronic_conditions": self.identify_chronic_conditions(records),
-            "preventive_recommendations": self.generate_preventive_recommendations(records)
+            "health_risks": self.assess_risks(digest),
+            "medication_risks": self.assess_medication_risks(digest),
+            "chronic_conditions": self.identify_chronic_conditions(digest),
+            "preventive_recommendations": self.generate_preventive_recommendations(digest)
         }
         return summary
     
     async def create_treatment_history(self, patient_data: dict) -> dict:
         """Create treatment history summary"""
-        records = patient_data.get("records", [])
+        digest = self.get_digest(patient_data)
         
         summary = {
-            "treatment_timeline": self.create_treatment_timeline(records),
-            "treatment_effectiveness": self.assess_treatment_effectiveness(records),
-            "ongoing_treatments": self.identify_ongoing_treatments(records),
-            "treatment_recommendations": self.generate_treatment_recommendations(records)
+            "treatment_timeline": self.create_treatment_timeline(digest),
+            "treatment_effectiveness": self.assess_treatment_effectiveness(digest),
+            "ongoing_treatments": self.identify_ongoing_treatments(digest),
+            "treatment_recommendations": self.generate_treatment_recommendations(digest)
         }
         return summary
     
@@ -329,13 +574,16 @@ class ClinicalMCPServer:
         """Stream drug interaction checking"""
         yield {"status": "checking", "message": "Analyzing medication interactions..."}
         
-        interactions = []
-        
-        for new_med in new_medications:
-            if new_med in self.drug_interactions:
-                for existing_med in existing_medications:
-                    if existing_med in self.drug_interactions[new_med]:
-                        interactions.append(self.drug_interactions[new_med][existing_med])
+        # Unordered pair -> message; interactions are indexed both ways, so a pair can be found from either drug
+        found = {}
+        existing_set = set(existing_medications)
+        for new_med in dict.fromkeys(new_medications):
+            partners = self.drug_interactions.get(new_med)
+            if partners:
+                # Sorted so the report order doesn't depend on set iteration order
+                for existing_med in sorted(existing_set.intersection(partners)):
+                    found.setdefault(frozenset((new_med, existing_med)), partners[existing_med])
+        interactions = list(found.values())
         
         if interactions:
             yield {"status": "interactions_found", "data": interactions, "message": f"Found {len(interactions)} potential interactions"}
@@ -343,89 +591,137 @@ class ClinicalMCPServer:
             yield {"status": "safe", "message": "No interactions detected"}
     
     # Helper methods for data analysis
-    def calculate_age_range(self, records: List[dict]) -> str:
+    def get_digest(self, patient_data: dict) -> RecordsDigest:
+        """Get the digest of a patient's records, reused while the data is the patient's cached entry"""
+        records = patient_data.get("records", [])
+        cache_key = (patient_data.get("patient_name") or "").strip().lower()
+        if self.patient_cache.get(cache_key) is not patient_data:
+            # Caller-supplied data is decoded fresh on every call, so there is nothing to reuse
+            return self.build_digest(records)
+        
+        digest = self.digest_cache.get(cache_key)
+        if digest is None or digest.records is not records:
+            digest = self.build_digest(records)
+            self.digest_cache[cache_key] = digest
+        return digest
+    
+    def build_digest(self, records: List[dict]) -> RecordsDigest:
+        """Scan the records once for everything the summary helpers need"""
+        diagnoses = []
+        medication_counts = Counter()
+        for record in records:
+            diagnosis = record.get('diagnosis')
+            if diagnosis:
+                diagnoses.append(diagnosis)
+            drugs = record.get('drugs_prescribed', [])
+            if drugs and drugs != ["None"]:
+                medication_counts.update(drugs)
+        
+        return RecordsDigest(
+            records=records,
+            diagnoses=diagnoses,
+            diagnosis_counts=Counter(diagnoses),
+            medication_counts=medication_counts
+        )
+    
+    def calculate_age_range(self, digest: RecordsDigest) -> str:
         """Calculate patient age range from records"""
-        ages = [record.get('patient_age_at_visit') for record in records if record.get('patient_age_at_visit')]
+        ages = [record.get('patient_age_at_visit') for record in digest.records if record.get('patient_age_at_visit')]
         if ages:
             return f"{min(ages)}-{max(ages)} years"
         return "Unknown"
     
-    def identify_primary_conditions(self, records: List[dict]) -> List[str]:
+    def identify_primary_conditions(self, digest: RecordsDigest) -> List[str]:
         """Identify primary medical conditions"""
-        diagnoses = [record.get('diagnosis') for record in records if record.get('diagnosis')]
-        # Count frequency and return most common
-        from collections import Counter
-        condition_counts = Counter(diagnoses)
-        return [condition for condition, count in condition_counts.most_common(3)]
+        # Most common diagnoses first
+        return [condition for condition, count in digest.diagnosis_counts.most_common(3)]
     
-    def analyze_medications(self, records: List[dict]) -> dict:
+    def analyze_medications(self, digest: RecordsDigest) -> dict:
         """Analyze medication history"""
-        all_medications = []
-        for record in records:
-            drugs = record.get('drugs_prescribed', [])
-            if drugs and drugs != ["None"]:
-                all_medications.extend(drugs)
-        
-        from collections import Counter
-        medication_counts = Counter(all_medications)
+        medication_counts = digest.medication_counts
         
         return {
-            "all_medications": list(set(all_medications)),
+            "all_medications": list(medication_counts),
             "medication_frequency": dict(medication_counts),
-            "total_unique_medications": len(set(all_medications))
+            "total_unique_medications": len(medication_counts)
         }
     
-    def get_recent_visits(self, records: List[dict], count: int = 3) -> List[dict]:
+    def get_sorted_visits(self, digest: RecordsDigest) -> List[dict]:
+        """Get all records sorted newest first, sorting only once per digest"""
+        if digest.sorted_desc is None:
+            digest.sorted_desc = sorted(digest.records, key=visit_date_key, reverse=True)
+        return digest.sorted_desc
+    
+    def get_diagnosis_positions(self, digest: RecordsDigest) -> Dict[str, List[int]]:
+        """Group visits by diagnosis as ascending positions in the newest-first order, built once per digest"""
+        if digest.diagnosis_positions is None:
+            positions = defaultdict(list)
+            for position, record in enumerate(self.get_sorted_visits(digest)):
+                diagnosis = record.get('diagnosis')
+                if diagnosis:
+                    positions[diagnosis].append(position)
+            digest.diagnosis_positions = dict(positions)
+        return digest.diagnosis_positions
+    
+    def get_visit_dates(self, digest: RecordsDigest) -> np.ndarray:
+        """Get the parseable visit dates as a datetime64[D] array, parsing them only once per digest"""
+        if digest.visit_dates is None:
+            date_strs = [record.get('date_of_visit') for record in digest.records]
+            date_strs = [date_str for date_str in date_strs if date_str and VISIT_DATE_PATTERN.fullmatch(date_str)]
+            try:
+                # Parse every date in one call
+                digest.visit_dates = np.array(date_strs, dtype='datetime64[D]')
+            except ValueError:
+                # Rare impossible days that pass the pattern (e.g. Feb 30); drop them one by one
+                dates = [parse_visit_date(date_str) for date_str in date_strs]
+                digest.visit_dates = np.array([visit_date for visit_date in dates if visit_date is not None], dtype='datetime64[D]')
+        return digest.visit_dates
+    
+    def get_recent_visits(self, digest: RecordsDigest, count: int = 3) -> List[dict]:
         """Get recent visits"""
-        sorted_records = sorted(records, key=lambda x: x.get('date_of_visit', ''), reverse=True)
-        return sorted_records[:count]
+        if digest.sorted_desc is not None:
+            return digest.sorted_desc[:count]
+        # Only the top few are needed, so skip the full sort
+        return heapq.nlargest(count, digest.records, key=visit_date_key)
     
-    def identify_patterns(self, records: List[dict]) -> List[str]:
+    def identify_patterns(self, digest: RecordsDigest) -> List[str]:
         """Identify clinical patterns"""
         patterns = []
         
         # Check for recurring conditions
-        diagnoses = [record.get('diagnosis') for record in records if record.get('diagnosis')]
-        from collections import Counter
-        diagnosis_counts = Counter(diagnoses)
-        
-        for diagnosis, count in diagnosis_counts.items():
+        for diagnosis, count in digest.diagnosis_counts.items():
             if count > 1:
                 patterns.append(f"Recurring {diagnosis} ({count} occurrences)")
         
         return patterns
     
-    def assess_risks(self, records: List[dict]) -> List[str]:
+    def assess_risks(self, digest: RecordsDigest) -> List[str]:
         """Assess health risks"""
         risks = []
         
         # Check for chronic conditions
-        chronic_conditions = self.identify_chronic_conditions(records)
+        chronic_conditions = self.identify_chronic_conditions(digest)
         if chronic_conditions:
             risks.extend([f"Chronic condition: {condition}" for condition in chronic_conditions])
         
         # Check for frequent visits
-        if len(records) > 5:
+        if len(digest.records) > 5:
             risks.append("High healthcare utilization")
         
         return risks
     
-    def identify_chronic_conditions(self, records: List[dict]) -> List[str]:
+    def identify_chronic_conditions(self, digest: RecordsDigest) -> List[str]:
         """Identify chronic conditions"""
-        diagnoses = [record.get('diagnosis') for record in records if record.get('diagnosis')]
-        from collections import Counter
-        diagnosis_counts = Counter(diagnoses)
-        
         chronic_conditions = []
-        for diagnosis, count in diagnosis_counts.items():
+        for diagnosis, count in digest.diagnosis_counts.items():
             if count > 2:  # Appears in more than 2 visits
                 chronic_conditions.append(diagnosis)
         
         return chronic_conditions
     
-    def get_current_medications(self, records: List[dict]) -> List[str]:
+    def get_current_medications(self, digest: RecordsDigest) -> List[str]:
         """Get current medications from recent visits"""
-        recent_records = self.get_recent_visits(records, 2)  # Last 2 visits
+        recent_records = self.get_recent_visits(digest, 2)  # Last 2 visits
         current_meds = []
         
         for record in recent_records:
@@ -435,144 +731,131 @@ class ClinicalMCPServer:
         
         return list(set(current_meds))
     
-    def create_medication_timeline(self, records: List[dict]) -> List[dict]:
-        """Create medication timeline"""
+    def create_medication_timeline(self, digest: RecordsDigest) -> List[dict]:
+        """Create medication timeline, newest first"""
         timeline = []
-        for record in records:
+        for record in self.get_sorted_visits(digest):
             if record.get('drugs_prescribed') and record.get('drugs_prescribed') != ["None"]:
                 timeline.append({
                     "date": record.get('date_of_visit'),
                     "medications": record.get('drugs_prescribed'),
                     "condition": record.get('diagnosis')
                 })
-        return sorted(timeline, key=lambda x: x.get('date', ''), reverse=True)
+        return timeline
     
-    def assess_medication_risks(self, records: List[dict]) -> List[str]:
+    def assess_medication_risks(self, digest: RecordsDigest) -> List[str]:
         """Assess medication-related risks"""
         risks = []
-        current_meds = self.get_current_medications(records)
+        current_meds = self.get_current_medications(digest)
         
-        # Check for potential interactions
-        for med1 in current_meds:
-            for med2 in current_meds:
-                if med1 != med2 and med1 in self.drug_interactions:
-                    if med2 in self.drug_interactions[med1]:
-                        risks.append(f"Potential interaction: {med1} + {med2}")
+        # Check each unordered pair for potential interactions
+        for med1, med2 in combinations(current_meds, 2):
+            if frozenset((med1, med2)) in self.interaction_pairs:
+                risks.append(f"Potential interaction: {med1} + {med2}")
         
         return risks
     
-    def calculate_visit_frequency(self, records: List[dict]) -> str:
+    def calculate_visit_frequency(self, digest: RecordsDigest) -> str:
         """Calculate visit frequency"""
+        records = digest.records
         if len(records) < 2:
             return "Insufficient data"
         
-        # Parse dates and calculate frequency
-        dates = []
-        for record in records:
-            date_str = record.get('date_of_visit')
-            if date_str and date_str != "3-DAYS-AGO":
-                try:
-                    dates.append(datetime.strptime(date_str, "%Y-%m-%d"))
-                except:
-                    pass
-        
+        # Calculate frequency from the parsed visit dates
+        dates = self.get_visit_dates(digest)
         if len(dates) < 2:
             return "Insufficient date data"
         
-        dates.sort()
-        time_span = (dates[-1] - dates[0]).days
+        time_span = int((dates.max() - dates.min()) / np.timedelta64(1, 'D'))
         if time_span > 0:
             frequency = len(dates) / (time_span / 365.25)  # visits per year
             return f"{frequency:.1f} visits per year"
         
         return "Unknown"
     
-    def identify_trending_conditions(self, records: List[dict]) -> List[str]:
+    def identify_trending_conditions(self, digest: RecordsDigest) -> List[str]:
         """Identify trending conditions"""
-        # Get recent vs older conditions
-        sorted_records = sorted(records, key=lambda x: x.get('date_of_visit', ''), reverse=True)
-        recent_count = len(sorted_records) // 2
-        recent_records = sorted_records[:recent_count]
-        older_records = sorted_records[recent_count:]
-        
-        recent_diagnoses = [r.get('diagnosis') for r in recent_records if r.get('diagnosis')]
-        older_diagnoses = [r.get('diagnosis') for r in older_records if r.get('diagnosis')]
-        
-        from collections import Counter
-        recent_counts = Counter(recent_diagnoses)
-        older_counts = Counter(older_diagnoses)
+        # Split visits into the recent half and the older half; each diagnosis' positions are
+        # ascending, so its recent count is the number of positions before the split
+        recent_count = len(digest.records) // 2
+        older_count = len(digest.records) - recent_count
         
         trending = []
-        for diagnosis in recent_counts:
-            recent_freq = recent_counts[diagnosis] / len(recent_records) if recent_records else 0
-            older_freq = older_counts[diagnosis] / len(older_records) if older_records else 0
-            
-            if recent_freq > older_freq * 1.5:  # 50% increase
+        for diagnosis, positions in self.get_diagnosis_positions(digest).items():
+            recent = bisect_left(positions, recent_count)
+            if not recent:
+                continue
+            older = len(positions) - recent
+            # recent frequency > 1.5 * older frequency (50% increase), cross-multiplied to stay in integers;
+            # older_count is never 0 here since the older half is the larger one
+            if 2 * recent * older_count > 3 * older * recent_count:
                 trending.append(diagnosis)
         
         return trending
     
-    def create_treatment_timeline(self, records: List[dict]) -> List[dict]:
-        """Create treatment timeline"""
+    def create_treatment_timeline(self, digest: RecordsDigest) -> List[dict]:
+        """Create treatment timeline, newest first"""
         timeline = []
-        for record in records:
+        for record in self.get_sorted_visits(digest):
             timeline.append({
                 "date": record.get('date_of_visit'),
                 "condition": record.get('diagnosis'),
                 "treatment": record.get('drugs_prescribed'),
                 "notes": record.get('doctor_notes')
             })
-        return sorted(timeline, key=lambda x: x.get('date', ''), reverse=True)
+        return timeline
     
-    def assess_treatment_effectiveness(self, records: List[dict]) -> List[str]:
+    def assess_treatment_effectiveness(self, digest: RecordsDigest) -> List[str]:
         """Assess treatment effectiveness"""
         effectiveness = []
         
         # Look for recurring conditions that might indicate ineffective treatment
-        chronic_conditions = self.identify_chronic_conditions(records)
+        chronic_conditions = self.identify_chronic_conditions(digest)
         for condition in chronic_conditions:
             effectiveness.append(f"Ongoing treatment for {condition} - monitor effectiveness")
         
         return effectiveness
     
-    def identify_ongoing_treatments(self, records: List[dict]) -> List[str]:
+    def identify_ongoing_treatments(self, digest: RecordsDigest) -> List[str]:
         """Identify ongoing treatments"""
-        return self.get_current_medications(records)
+        return self.get_current_medications(digest)
     
-    def generate_treatment_recommendations(self, records: List[dict]) -> List[str]:
+    def generate_treatment_recommendations(self, digest: RecordsDigest) -> List[str]:
         """Generate treatment recommendations"""
         recommendations = []
         
         # Based on patterns and risks
-        patterns = self.identify_patterns(records)
+        patterns = self.identify_patterns(digest)
         if patterns:
             recommendations.append("Consider preventive measures for recurring conditions")
         
-        risks = self.assess_risks(records)
+        risks = self.assess_risks(digest)
         if risks:
             recommendations.append("Monitor identified risk factors closely")
         
         return recommendations
     
-    def generate_preventive_recommendations(self, records: List[dict]) -> List[str]:
+    def generate_preventive_recommendations(self, digest: RecordsDigest) -> List[str]:
         """Generate preventive recommendations"""
         recommendations = []
         
-        # Based on conditions and patterns
-        conditions = [r.get('diagnosis') for r in records if r.get('diagnosis')]
-        if any('BPPV' in condition for condition in conditions):
-            recommendations.append("Consider vestibular rehabilitation exercises")
-        
-        if any('GERD' in condition for condition in conditions):
-            recommendations.append("Maintain dietary modifications for GERD management")
+        # Based on conditions and patterns, in one scan over every diagnosis
+        matched = set(PREVENTIVE_KEYWORD_PATTERN.findall("\n".join(digest.diagnoses)))
+        for keyword, recommendation in PREVENTIVE_RECOMMENDATIONS:
+            if keyword in matched:
+                recommendations.append(recommendation)
         
         return recommendations
 
 async def main():
     """Run the MCP server"""
     server = ClinicalMCPServer()
-    async with stdio_server() as (read_stream, write_stream):
-        await server.run(read_stream, write_stream)
+    await server.connect_elasticsearch()
+    try:
+        async with stdio_server() as (read_stream, write_stream):
+            await server.run(read_stream, write_stream)
+    finally:
+        await server.close_elasticsearch()
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -5,70 +5,114 @@ A simplified version that works with the current MCP library structure
 """
 
 import asyncio
+import heapq
 import json
 import logging
 import os
+import signal
 import sys
+import threading
+from collections import Counter
 from typing import Dict, List, Any, AsyncGenerator
 
 # Add the current directory to Python path
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
+from cachetools import TTLCache
 from elasticsearch import Elasticsearch
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Fast JSON decoding for the interactions file and Elasticsearch responses; falls back to the stdlib when orjson isn't installed
+try:
+    import orjson
+    from elasticsearch.serializer import OrjsonSerializer
+    _json_loads = orjson.loads
+    ES_SERIALIZER = OrjsonSerializer()
+except ImportError:
+    _json_loads = json.loads
+    ES_SERIALIZER = None  # The client's default JSON serializer
+
+DRUG_INTERACTIONS_PATH = 'data/drug-interactions-data.json'
+# Interaction warnings are formatted only when a pair is actually reported
+INTERACTION_MESSAGE = "⚠️ INTERACTION: Potential interaction between {} and {}."
+
+# Only the most recent visits are ever summarized, so cap what Elasticsearch returns
+PATIENT_RECORD_LIMIT = 20
+
+# Pooled keep-alive connections per Elasticsearch node, sized for the avatar's bursts of lookups
+ES_CONNECTIONS_PER_NODE = int(os.environ.get('ES_CONNECTIONS_PER_NODE', '25'))
+ES_REQUEST_TIMEOUT = 10
+
+# Patient lookups repeat within a conversation turn; entries expire after the TTL, in seconds
+PATIENT_CACHE_SIZE = 256
+PATIENT_CACHE_TTL = 30
+
 class SimpleClinicalServer:
     def __init__(self):
-        self.elastic_client = None
-        self.elastic_index_name = None
+        self._elastic_client = None
+        self._es_initialized = False  # The client is created and pinged on first use, not at import
+        self.elastic_index_name = os.environ.get('ELASTIC_INDEX_NAME')
         self.drug_interactions = {}
-        self.setup_elasticsearch()
+        self.patient_cache = TTLCache(maxsize=PATIENT_CACHE_SIZE, ttl=PATIENT_CACHE_TTL)  # (lowercased name, index) -> patient data
+        self.summary_cache = TTLCache(maxsize=PATIENT_CACHE_SIZE, ttl=PATIENT_CACHE_TTL)  # (patient key, type) -> (data, summary)
         self.load_drug_interactions()
     
+    @property
+    def elastic_client(self):
+        """Elasticsearch client, connected on first access; None if unavailable"""
+        if not self._es_initialized:
+            self._es_initialized = True
+            self.setup_elasticsearch()
+        return self._elastic_client
+    
     def setup_elasticsearch(self):
         """Initialize Elasticsearch connection"""
         elastic_url = os.environ.get('ELASTIC_URL')
         elastic_api_key = os.environ.get('ELASTIC_API_KEY')
-        self.elastic_index_name = os.environ.get('ELASTIC_INDEX_NAME')
         
         if elastic_url and elastic_api_key:
             try:
-                self.elastic_client = Elasticsearch(
+                self._elastic_client = Elasticsearch(
                     hosts=[elastic_url],
                     api_key=elastic_api_key,
-                    verify_certs=True
+                    verify_certs=True,
+                    connections_per_node=ES_CONNECTIONS_PER_NODE,
+                    http_compress=True,
+                    request_timeout=ES_REQUEST_TIMEOUT,
+                    retry_on_timeout=True,
+                    sniff_on_start=False,
+                    sniff_on_node_failure=False,
+                    serializer=ES_SERIALIZER
                 )
-                if self.elastic_client.ping():
+                if self._elastic_client.ping():
                     logger.info("Elasticsearch connection successful!")
                 else:
                     logger.error("Elasticsearch connection failed!")
-                    self.elastic_client = None
+                    self._elastic_client = None
             except Exception as e:
                 logger.error(f"Failed to initialize Elasticsearch client: {e}")
-                self.elastic_client = None
+                self._elastic_client = None
         else:
             logger.warning("Elasticsearch credentials not configured")
     
     def load_drug_interactions(self):
         """Load drug interactions data"""
         try:
-            with open('data/drug-interactions-data.json', 'r') as f:
-                interactions_data = json.load(f)
+            with open(DRUG_INTERACTIONS_PATH, 'rb') as f:
+                interactions_data = _json_loads(f.read())
             
-            # Convert to the format expected by the existing code
+            # Convert to the format expected by the existing code; names are lowercased so lookups ignore case
             for item in interactions_data:
-                primary_drug = item['primary_drug']
+                primary_drug = item['primary_drug'].lower()
                 negative_interactions = item['negative_drug_interactions']
                 
-                if primary_drug not in self.drug_interactions:
-                    self.drug_interactions[primary_drug] = {}
-                
+                partners = self.drug_interactions.setdefault(primary_drug, set())
                 for interaction_drug in negative_interactions:
                     if interaction_drug != "None":
-                        self.drug_interactions[primary_drug][interaction_drug] = f"⚠️ INTERACTION: Potential interaction between {primary_drug} and {interaction_drug}."
+                        partners.add(interaction_drug.lower())
             
             logger.info(f"Loaded {len(self.drug_interactions)} drug interaction entries")
         except Exception as e:
@@ -76,34 +120,55 @@ class SimpleClinicalServer:
     
     def get_patient_data(self, patient_name: str) -> Dict[str, Any]:
         """Get patient data from Elasticsearch"""
-        logger.info(f"Querying patient data for: '{patient_name}'")
+        return self.get_patient_data_batch([patient_name])[0]
+    
+    def get_patient_data_batch(self, patient_names: List[str]) -> List[Dict[str, Any]]:
+        """Get patient data for several patients with a single msearch round trip.
+        Results are returned in the same order as patient_names."""
+        logger.info(f"Querying patient data for: {patient_names}")
+        
+        if not patient_names:
+            return []
         
         if not self.elastic_client or not self.elastic_index_name:
-            return {"error": "Elasticsearch client not configured"}
+            return [{"error": "Elasticsearch client not configured"} for _ in patient_names]
+        
+        # Serve repeated lookups from the cache and only search for the rest
+        results = [self.patient_cache.get(self.patient_cache_key(patient_name)) for patient_name in patient_names]
+        missing = list(dict.fromkeys(patient_name for patient_name, result in zip(patient_names, results) if result is None))
+        if not missing:
+            return results
         
         try:
-            # Use a simpler query structure
-            query = {
-                "query": {
-                    "match": {
-                        "patient_name": patient_name
-                    }
-                },
-                "_source": [
-                    "date_of_visit",
-                    "patient_complaint", 
-                    "diagnosis",
-                    "doctor_notes",
-                    "drugs_prescribed",
-                    "patient_age_at_visit",
-                    "patient_name"
-                ]
-            }
+            # One header/body pair per patient; newest visits first so callers can just slice
+            searches = []
+            for patient_name in missing:
+                searches.append({"index": self.elastic_index_name})
+                searches.append({
+                    "query": {
+                        "match": {
+                            "patient_name": patient_name
+                        }
+                    },
+                    "size": PATIENT_RECORD_LIMIT,
+                    "sort": [{"date_of_visit": {"order": "desc"}}],
+                    "track_total_hits": False,
+                    "_source": [
+                        "date_of_visit",
+                        "patient_complaint", 
+                        "diagnosis",
+                        "doctor_notes",
+                        "drugs_prescribed",
+                        "patient_age_at_visit",
+                        "patient_name"
+                    ]
+                })
             
-            # Execute the search
-            response = self.elastic_client.search(
-                index=self.elastic_index_name,
-                body=query
+            # Execute the searches, stripping scores and metadata from the response body. Every response
+            # keeps its status, so searches without hits still hold their slot in the responses list.
+            response = self.elastic_client.msearch(
+                searches=searches,
+                filter_path=["responses.status", "responses.hits.hits._source", "responses.error"]
             )
             
             # Convert response to dictionary if it's an ObjectApiResponse
@@ -112,42 +177,71 @@ class SimpleClinicalServer:
             else:
                 response_dict = response
             
-            # Extract and format the results
-            hits = response_dict.get('hits', {}).get('hits', [])
-            patient_records = []
+            # Responses come back in request order, one per search; only successful lookups are cached
+            responses = response_dict.get('responses', [])
+            if len(responses) != len(missing):
+                raise ValueError(f"msearch returned {len(responses)} responses for {len(missing)} searches")
             
-            for hit in hits:
-                source = hit.get('_source', {})
-                patient_records.append({
-                    'date_of_visit': source.get('date_of_visit'),
-                    'patient_complaint': source.get('patient_complaint'),
-                    'diagnosis': source.get('diagnosis'),
-                    'doctor_notes': source.get('doctor_notes'),
-                    'drugs_prescribed': source.get('drugs_prescribed'),
-                    'patient_age_at_visit': source.get('patient_age_at_visit'),
-                    'patient_name': source.get('patient_name')
-                })
-            
-            return {
-                "success": True,
-                "patient_name": patient_name,
-                "total_records": len(patient_records),
-                "records": patient_records
-            }
+            fetched = {}
+            for patient_name, item in zip(missing, responses):
+                result = self.format_patient_response(patient_name, item)
+                if result.get("success"):
+                    self.patient_cache[self.patient_cache_key(patient_name)] = result
+                fetched[patient_name] = result
             
         except Exception as e:
             logger.error(f"Error querying patient data: {str(e)}")
-            return {"error": f"Failed to query patient data: {str(e)}"}
+            error = {"error": f"Failed to query patient data: {str(e)}"}
+            fetched = {patient_name: error for patient_name in missing}
+        
+        return [result if result is not None else fetched.get(patient_name) or self.format_patient_response(patient_name, {})
+                for patient_name, result in zip(patient_names, results)]
+    
+    def patient_cache_key(self, patient_name: str) -> tuple:
+        """Cache key for a patient lookup against the configured index"""
+        return (patient_name.strip().lower(), self.elastic_index_name)
+    
+    def format_patient_response(self, patient_name: str, response_item: Dict[str, Any]) -> Dict[str, Any]:
+        """Extract and format the records from one search response"""
+        if "error" in response_item:
+            logger.error(f"Error querying patient data for '{patient_name}': {response_item['error']}")
+            return {"error": f"Failed to query patient data: {response_item['error']}"}
+        
+        hits = response_item.get('hits', {}).get('hits', [])
+        patient_records = []
+        
+        for hit in hits:
+            source = hit.get('_source', {})
+            patient_records.append({
+                'date_of_visit': source.get('date_of_visit'),
+                'patient_complaint': source.get('patient_complaint'),
+                'diagnosis': source.get('diagnosis'),
+                'doctor_notes': source.get('doctor_notes'),
+                # Normalized once here; the summary helpers still drop "None" for records supplied by callers
+                'drugs_prescribed': tuple(drug for drug in (source.get('drugs_prescribed') or ()) if drug != "None"),
+                'patient_age_at_visit': source.get('patient_age_at_visit'),
+                'patient_name': source.get('patient_name')
+            })
+        
+        return {
+            "success": True,
+            "patient_name": patient_name,
+            "total_records": len(patient_records),
+            "records": patient_records
+        }
     
     def check_medication_interactions(self, new_medications: List[str], existing_medications: List[str]) -> List[str]:
         """Check for medication interactions"""
         interactions = []
         
+        # Lowercased name -> name as given, so messages keep the caller's spelling
+        existing_by_name = {existing_med.lower(): existing_med for existing_med in existing_medications}
         for new_med in new_medications:
-            if new_med in self.drug_interactions:
-                for existing_med in existing_medications:
-                    if existing_med in self.drug_interactions[new_med]:
-                        interactions.append(self.drug_interactions[new_med][existing_med])
+            partners = self.drug_interactions.get(new_med.lower())
+            if partners:
+                # Sorted so warnings come out in the same order on every run
+                interactions.extend(INTERACTION_MESSAGE.format(new_med, existing_by_name[name])
+                                    for name in sorted(partners.intersection(existing_by_name)))
         
         return interactions
     
@@ -156,22 +250,35 @@ class SimpleClinicalServer:
         if not patient_data or not patient_data.get("success"):
             return {"error": "Invalid patient data provided"}
         
+        # Cached patient data is the same dict across callers, so its summaries are built once. Data supplied
+        # by callers is decoded fresh on every call and never seen again, so it isn't cached.
+        patient_key = self.patient_cache_key(patient_data.get("patient_name") or "")
+        cache_key = None
+        if self.patient_cache.get(patient_key) is patient_data:
+            cache_key = (patient_key, summary_type)
+            cached = self.summary_cache.get(cache_key)
+            # A refreshed patient entry is a new dict, so a summary of the old one is rebuilt
+            if cached is not None and cached[0] is patient_data:
+                return cached[1]
+        
         records = patient_data.get("records", [])
         
         if summary_type == "comprehensive":
+            diagnosis_counts, medication_counts = self.aggregate_records(records)
             summary = {
                 "patient_overview": {
                     "name": patient_data.get("patient_name"),
                     "total_visits": patient_data.get("total_records"),
-                    "primary_conditions": self.identify_primary_conditions(records)
+                    "primary_conditions": self.identify_primary_conditions(diagnosis_counts)
                 },
-                "medication_history": self.analyze_medications(records),
+                "medication_history": self.analyze_medications(medication_counts),
                 "recent_visits": self.get_recent_visits(records),
-                "clinical_patterns": self.identify_patterns(records)
+                "clinical_patterns": self.identify_patterns(diagnosis_counts)
             }
         elif summary_type == "medication_focus":
+            _, medication_counts = self.aggregate_records(records)
             summary = {
-                "medication_history": self.analyze_medications(records),
+                "medication_history": self.analyze_medications(medication_counts),
                 "current_medications": self.get_current_medications(records),
                 "interaction_risks": self.assess_medication_risks(records)
             }
@@ -184,46 +291,46 @@ class SimpleClinicalServer:
                 "recent_visits": self.get_recent_visits(records)
             }
         
+        if cache_key is not None:
+            self.summary_cache[cache_key] = (patient_data, summary)
         return summary
     
-    def identify_primary_conditions(self, records: List[dict]) -> List[str]:
+    def aggregate_records(self, records: List[dict]) -> tuple:
+        """Count diagnoses and prescribed medications in a single pass over the records"""
+        diagnosis_counts = Counter()
+        medication_counts = Counter()
+        
+        for record in records:
+            diagnosis = record.get('diagnosis')
+            if diagnosis:
+                diagnosis_counts[diagnosis] += 1
+            # Records passed in by callers may not have been normalized by format_patient_response
+            medication_counts.update(drug for drug in record.get('drugs_prescribed') or () if drug != "None")
+        
+        return diagnosis_counts, medication_counts
+    
+    def identify_primary_conditions(self, diagnosis_counts: Counter) -> List[str]:
         """Identify primary medical conditions"""
-        diagnoses = [record.get('diagnosis') for record in records if record.get('diagnosis')]
-        from collections import Counter
-        condition_counts = Counter(diagnoses)
-        return [condition for condition, count in condition_counts.most_common(3)]
+        return [condition for condition, count in diagnosis_counts.most_common(3)]
     
-    def analyze_medications(self, records: List[dict]) -> dict:
+    def analyze_medications(self, medication_counts: Counter) -> dict:
         """Analyze medication history"""
-        all_medications = []
-        for record in records:
-            drugs = record.get('drugs_prescribed', [])
-            if drugs and drugs != ["None"]:
-                all_medications.extend(drugs)
-        
-        from collections import Counter
-        medication_counts = Counter(all_medications)
-        
         return {
-            "all_medications": list(set(all_medications)),
+            "all_medications": list(medication_counts),
             "medication_frequency": dict(medication_counts),
-            "total_unique_medications": len(set(all_medications))
+            "total_unique_medications": len(medication_counts)
         }
     
     def get_recent_visits(self, records: List[dict], count: int = 3) -> List[dict]:
-        """Get recent visits"""
-        sorted_records = sorted(records, key=lambda x: x.get('date_of_visit', ''), reverse=True)
-        return sorted_records[:count]
+        """Get recent visits without sorting the whole record list"""
+        # Callers may pass records that did not come from get_patient_data's sorted query
+        return heapq.nlargest(count, records, key=lambda x: x.get('date_of_visit') or '')
     
-    def identify_patterns(self, records: List[dict]) -> List[str]:
+    def identify_patterns(self, diagnosis_counts: Counter) -> List[str]:
         """Identify clinical patterns"""
         patterns = []
         
         # Check for recurring conditions
-        diagnoses = [record.get('diagnosis') for record in records if record.get('diagnosis')]
-        from collections import Counter
-        diagnosis_counts = Counter(diagnoses)
-        
         for diagnosis, count in diagnosis_counts.items():
             if count > 1:
                 patterns.append(f"Recurring {diagnosis} ({count} occurrences)")
@@ -232,27 +339,32 @@ class SimpleClinicalServer:
     
     def get_current_medications(self, records: List[dict]) -> List[str]:
         """Get current medications from recent visits"""
-        recent_records = self.get_recent_visits(records, 2)  # Last 2 visits
-        current_meds = []
+        return sorted(self.get_current_medication_set(records))
+    
+    def get_current_medication_set(self, records: List[dict]) -> set:
+        """Set of medications prescribed in the last 2 visits"""
+        current_meds = set()
         
-        for record in recent_records:
-            drugs = record.get('drugs_prescribed', [])
-            if drugs and drugs != ["None"]:
-                current_meds.extend(drugs)
+        for record in self.get_recent_visits(records, 2):
+            current_meds.update(drug for drug in record.get('drugs_prescribed') or () if drug != "None")
         
-        return list(set(current_meds))
+        return current_meds
     
     def assess_medication_risks(self, records: List[dict]) -> List[str]:
         """Assess medication-related risks"""
         risks = []
-        current_meds = self.get_current_medications(records)
+        current_set = self.get_current_medication_set(records)
         
-        # Check for potential interactions
-        for med1 in current_meds:
-            for med2 in current_meds:
-                if med1 != med2 and med1 in self.drug_interactions:
-                    if med2 in self.drug_interactions[med1]:
-                        risks.append(f"Potential interaction: {med1} + {med2}")
+        # Check for potential interactions: intersect each med's interaction partners with the current set
+        current_by_name = {med.lower(): med for med in current_set}
+        # Sorted so risks come out in the same order on every run
+        for name1 in sorted(current_by_name):
+            med1 = current_by_name[name1]
+            partners = self.drug_interactions.get(name1)
+            if partners:
+                for name2 in sorted(partners.intersection(current_by_name)):
+                    if name2 != name1:
+                        risks.append(f"Potential interaction: {med1} + {current_by_name[name2]}")
         
         return risks
 
@@ -263,6 +375,10 @@ def get_patient_data(patient_name: str) -> Dict[str, Any]:
     """Get patient data - wrapper function"""
     return clinical_server.get_patient_data(patient_name)
 
+def get_patient_data_batch(patient_names: List[str]) -> List[Dict[str, Any]]:
+    """Get patient data for several patients - wrapper function"""
+    return clinical_server.get_patient_data_batch(patient_names)
+
 def check_medication_interactions(new_medications: List[str], existing_medications: List[str]) -> List[str]:
     """Check medication interactions - wrapper function"""
     return clinical_server.check_medication_interactions(new_medications, existing_medications)
@@ -272,10 +388,6 @@ def create_patient_summary(patient_data: Dict[str, Any], summary_type: str = "co
     return clinical_server.create_patient_summary(patient_data, summary_type)
 
 if __name__ == "__main__":
-    import time
-    import signal
-    import sys
-    
     # Test the server first
     print("Testing Simple Clinical Server...")
     
@@ -302,9 +414,12 @@ if __name__ == "__main__":
     signal.signal(signal.SIGTERM, signal_handler)
     
     try:
-        # Keep the server running
-        while True:
-            time.sleep(1)
+        # Block until a signal arrives; the handlers exit the process
+        if hasattr(signal, "pause"):
+            signal.pause()
+        else:
+            # No signal.pause() on Windows
+            threading.Event().wait()
     except KeyboardInterrupt:
         print("\nServer stopped by user")
     except Exception as e:
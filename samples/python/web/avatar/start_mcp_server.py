@@ -6,14 +6,8 @@ Script to start the MCP server with proper configuration
 
 import asyncio
 import sys
-import os
 import logging
-from pathlib import Path
 
-# Add the current directory to Python path
-sys.path.append(os.path.dirname(os.path.abspath(__file__)))
-
-from mcp_server import ClinicalMCPServer
 from mcp_config import validate_and_get_config
 
 def setup_logging():
@@ -39,12 +33,16 @@ async def main():
     logger = setup_logging()
     
     try:
+        # Imported here so failures in its heavier dependencies are logged like any other startup error
+        from mcp_server import ClinicalMCPServer
+        
         # Validate configuration
         config = validate_and_get_config()
         logger.info("Configuration validated successfully")
         
         # Create and start the MCP server
         server = ClinicalMCPServer()
+        await server.connect_elasticsearch()
         logger.info("MCP Server created successfully")
         
         # Start the server
@@ -0,0 +1,263 @@
+import asyncio
+import json
+
+import mcp_client
+from mcp_client import _TTLCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_ttl_cache_expires_entries(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(mcp_client.time, "monotonic", clock)
+    cache = _TTLCache(size=4, ttl=10)
+
+    cache.set("a", 1)
+    clock.now = 9.9
+    assert cache.get("a") == 1
+    clock.now = 10.0
+    assert cache.get("a") is None
+
+
+def test_ttl_cache_evicts_least_recently_used():
+    cache = _TTLCache(size=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+
+
+def test_ttl_cache_size_zero_disables_caching():
+    cache = _TTLCache(size=0, ttl=60)
+    cache.set("a", 1)
+    assert cache.get("a") is None
+
+
+def run_single_flight_callers(callers):
+    """Run the callers against one client's _single_flight and return the client with the callers' outcomes"""
+    async def main():
+        client = mcp_client.StreamingClinicalMCPClient()
+        return client, await callers(client)
+
+    return asyncio.run(main())
+
+
+def test_single_flight_coalesces_concurrent_callers():
+    calls = []
+
+    async def callers(client):
+        release = asyncio.Event()
+
+        async def work():
+            calls.append(1)
+            await release.wait()
+            return {"records": []}
+
+        tasks = [asyncio.create_task(client._single_flight(("k",), work)) for _ in range(3)]
+        await asyncio.sleep(0)
+        release.set()
+        return await asyncio.gather(*tasks)
+
+    client, results = run_single_flight_callers(callers)
+    assert calls == [1]
+    assert results == [{"records": []}] * 3
+    assert client._inflight == {}
+
+
+def test_single_flight_leader_cancellation_does_not_cancel_waiters():
+    async def callers(client):
+        release = asyncio.Event()
+
+        async def work():
+            await release.wait()
+            return "result"
+
+        leader = asyncio.create_task(client._single_flight(("k",), work))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(client._single_flight(("k",), work))
+        await asyncio.sleep(0)
+
+        leader.cancel()
+        await asyncio.sleep(0)
+        release.set()
+        return await asyncio.gather(leader, waiter, return_exceptions=True)
+
+    client, (leader_outcome, waiter_outcome) = run_single_flight_callers(callers)
+    assert isinstance(leader_outcome, asyncio.CancelledError)
+    assert waiter_outcome == "result"
+    assert client._inflight == {}
+
+
+def test_single_flight_shares_errors_and_retries_afterwards():
+    attempts = []
+
+    async def callers(client):
+        async def failing():
+            attempts.append(1)
+            await asyncio.sleep(0)
+            raise RuntimeError("search failed")
+
+        async def succeeding():
+            attempts.append(1)
+            return "ok"
+
+        first = await asyncio.gather(
+            client._single_flight(("k",), failing),
+            client._single_flight(("k",), failing),
+            return_exceptions=True,
+        )
+        return first, await client._single_flight(("k",), succeeding)
+
+    _, (first, retried) = run_single_flight_callers(callers)
+    assert [str(outcome) for outcome in first] == ["search failed"] * 2
+    assert retried == "ok"
+    assert len(attempts) == 2
+
+
+class FakeStreamingSession:
+    """Session stub that replays fixed chat chunks and answers tool calls"""
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    async def stream_chat_completion(self, messages, tools):
+        for chunk in self.chunks:
+            yield chunk
+
+    async def call_tool(self, name, args):
+        return {"message": f"{name} completed"}
+
+
+def collect_user_query(method_name, chunks):
+    async def main():
+        client = mcp_client.StreamingClinicalMCPClient()
+        client.session = FakeStreamingSession(chunks)
+        client.connected = True
+        return [item async for item in getattr(client, method_name)("query", None)]
+
+    return asyncio.run(main())
+
+
+CHAT_CHUNKS = [
+    {"type": "tool_call", "name": "get_patient_data", "arguments": {"patient_name": "Jane Doe"}},
+    {"type": "text", "content": "Recent visits"},
+    {"type": "tool_result", "result": {"status": "error", "message": "Timed out"}},
+]
+
+
+def test_text_stream_keeps_status_indicators():
+    assert collect_user_query("handle_user_query_streaming", CHAT_CHUNKS) == [
+        "🔍 get_patient_data completed",
+        "Recent visits",
+        "❌ Timed out",
+    ]
+
+
+def test_ndjson_stream_frames_the_same_events():
+    frames = collect_user_query("stream_user_query_ndjson", CHAT_CHUNKS)
+    assert all(frame.endswith(b"\n") for frame in frames)
+    assert [json.loads(frame) for frame in frames] == [
+        {"t": "status", "p": "get_patient_data completed"},
+        {"t": "text", "p": "Recent visits"},
+        {"t": "error", "p": "Timed out"},
+    ]
+
+
+def test_text_stream_reports_missing_connection():
+    async def main():
+        client = mcp_client.StreamingClinicalMCPClient()
+        return [item async for item in client.handle_user_query_streaming("query", None)]
+
+    assert asyncio.run(main()) == ["❌ MCP client not connected. Please check server status."]
+
+
+class FakeTool:
+    def __init__(self, name, description):
+        self.name = name
+        self.description = description
+        self.inputSchema = {"type": "object", "properties": {"name": {"type": "string"}}}
+
+
+class FakeListingSession:
+    """Session stub that lists a fixed set of tools and counts the listings"""
+
+    def __init__(self):
+        self.list_calls = 0
+
+    async def list_tools(self):
+        self.list_calls += 1
+        return type("ToolsResponse", (), {"tools": [
+            FakeTool("get_patient_data", "Retrieve raw patient medical records. Returns records."),
+            FakeTool("summarize_patient_data", "Analyze and summarize patient medical data"),
+        ]})()
+
+
+def test_deferred_tools_are_announced_and_found_without_listing_again(monkeypatch):
+    monkeypatch.setattr(mcp_client, "DEFERRED_TOOLS", {"summarize_patient_data"})
+
+    async def main():
+        client = mcp_client.StreamingClinicalMCPClient()
+        client.session = FakeListingSession()
+        await client.discover_tools()
+        found = await client.execute_tool_call({"name": "search_tools", "arguments": {"query": "summarize", "detail": "full"}})
+        return client, found
+
+    client, found = asyncio.run(main())
+    assert client._default_tools == ("get_patient_data", "search_tools")
+    prompt = client._tool_summary_message(client._default_tools)["content"]
+    assert "- get_patient_data: Retrieve raw patient medical records\n" in prompt
+    assert "1 more tools are not listed; call search_tools" in prompt
+    assert found["tools"] == [{
+        "name": "summarize_patient_data",
+        "description": "Analyze and summarize patient medical data",
+        "input_schema": {"type": "object", "properties": {"name": {"type": "string"}}},
+    }]
+    assert client.session.list_calls == 1
+
+
+class CountingSession:
+    def __init__(self):
+        self.calls = []
+
+    async def call_tool(self, name, args):
+        self.calls.append(args)
+        return {"status": "complete", "args": args}
+
+
+def test_tool_cache_folds_case_only_in_patient_names():
+    async def main():
+        client = mcp_client.StreamingClinicalMCPClient()
+        client.session = CountingSession()
+        first = await client.get_patient_summary("Jane Doe", "comprehensive")
+        same_patient = await client.get_patient_summary(" jane doe", "comprehensive")
+        other_type = await client.get_patient_summary("Jane Doe", "Comprehensive")
+        return client.session.calls, first, same_patient, other_type
+
+    calls, first, same_patient, other_type = asyncio.run(main())
+    assert same_patient is first
+    assert other_type is not first
+    assert len(calls) == 2
+
+
+def test_helpers_call_through_the_connected_client(monkeypatch):
+    client = mcp_client.StreamingClinicalMCPClient()
+    client.session = CountingSession()
+    client.connected = True
+    monkeypatch.setattr(mcp_client, "mcp_client", client)
+
+    async def not_expected():
+        raise AssertionError("a connected client shouldn't go through get_mcp_client")
+
+    monkeypatch.setattr(mcp_client, "get_mcp_client", not_expected)
+    result = asyncio.run(mcp_client.get_patient_data_with_mcp("Jane Doe"))
+    assert result == {"status": "complete", "args": {"patient_name": "Jane Doe"}}
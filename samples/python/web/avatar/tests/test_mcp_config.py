@@ -0,0 +1,44 @@
+import dataclasses
+import json
+
+import pytest
+
+import mcp_config
+from mcp_config import MCPConfig
+
+
+def test_config_builds_without_arguments(monkeypatch):
+    monkeypatch.setenv("MCP_CACHE_SIZE", "7")
+    config = MCPConfig()
+    assert config.get_performance_config()["cache_size"] == 7
+    assert config.get_server_config()["name"] == "clinical-assistant"
+
+
+def test_getters_return_plain_json_serializable_copies():
+    config = MCPConfig()
+    tools = config.get_tools()
+    assert json.loads(json.dumps(tools)) == tools
+    assert json.loads(json.dumps(config.get_server_config()))["capabilities"]["tools"] is True
+    json.dumps(config.get_security_config())
+
+    # Changing a returned copy leaves the shared configuration alone
+    config.get_streaming_config()["chunk_size"] = 1
+    assert config.get_streaming_config()["chunk_size"] == 1024
+
+
+def test_config_is_frozen():
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        MCPConfig().server_name = "other"
+
+
+def test_validation_is_memoized_per_instance(monkeypatch, caplog):
+    monkeypatch.setattr(mcp_config, "_REQUIRED_ENV", ("MCP_TEST_UNSET_VARIABLE",))
+    monkeypatch.delenv("MCP_TEST_UNSET_VARIABLE", raising=False)
+    mcp_config._validate_config.cache_clear()
+    config = MCPConfig()
+
+    assert config.validate_config() is True
+    assert config.validate_config() is True
+    assert MCPConfig().validate_config() is True
+    # The missing-variable warning is logged once per instance validated
+    assert caplog.text.count("MCP_TEST_UNSET_VARIABLE") == 2
@@ -0,0 +1,323 @@
+import asyncio
+import json
+
+import pytest
+
+import mcp_server
+from mcp_server import PatientSearchBatcher
+
+
+class FakeAsyncElasticsearch:
+    """Async client stub that answers each msearch with the hits registered for the patient searched"""
+
+    def __init__(self, hits_by_name=None, error=None):
+        self.hits_by_name = hits_by_name or {}
+        self.error = error
+        self.msearch_calls = []
+
+    async def msearch(self, searches):
+        self.msearch_calls.append(searches)
+        if self.error is not None:
+            raise self.error
+        responses = []
+        for body in searches[1::2]:
+            name = body["name"]
+            if name == "broken":
+                responses.append({"error": {"type": "search_phase_execution_exception"}, "status": 400})
+            else:
+                responses.append({"hits": {"hits": self.hits_by_name.get(name, [])}, "status": 200})
+        return {"responses": responses}
+
+
+def test_batcher_coalesces_concurrent_searches_into_one_msearch():
+    client = FakeAsyncElasticsearch({"jane": [{"_source": {"patient_name": "Jane"}}]})
+
+    async def main():
+        batcher = PatientSearchBatcher(client, "patients")
+        results = await asyncio.gather(
+            batcher.search({"name": "jane"}, preference="jane"),
+            batcher.search({"name": "nobody"}),
+        )
+        return batcher, results
+
+    batcher, (jane, nobody) = asyncio.run(main())
+    assert len(client.msearch_calls) == 1
+    assert client.msearch_calls[0][0] == {"index": "patients", "preference": "jane"}
+    assert jane["hits"]["hits"] == [{"_source": {"patient_name": "Jane"}}]
+    assert nobody["hits"]["hits"] == []
+    assert batcher.tasks == set()
+
+
+def test_batcher_fails_only_the_search_that_errored():
+    client = FakeAsyncElasticsearch({"jane": [{"_source": {}}]})
+
+    async def main():
+        batcher = PatientSearchBatcher(client, "patients")
+        return await asyncio.gather(
+            batcher.search({"name": "broken"}),
+            batcher.search({"name": "jane"}),
+            return_exceptions=True,
+        )
+
+    broken, jane = asyncio.run(main())
+    assert isinstance(broken, RuntimeError)
+    assert jane["hits"]["hits"] == [{"_source": {}}]
+
+
+def test_batcher_fails_every_search_when_msearch_raises():
+    client = FakeAsyncElasticsearch(error=ConnectionError("cluster unreachable"))
+
+    async def main():
+        batcher = PatientSearchBatcher(client, "patients")
+        return await asyncio.gather(
+            batcher.search({"name": "a"}),
+            batcher.search({"name": "b"}),
+            return_exceptions=True,
+        )
+
+    assert [str(outcome) for outcome in asyncio.run(main())] == ["cluster unreachable"] * 2
+
+
+def test_batcher_fails_searches_missing_from_a_short_response():
+    class ShortResponseClient(FakeAsyncElasticsearch):
+        async def msearch(self, searches):
+            return {"responses": [{"hits": {"hits": []}, "status": 200}]}
+
+    async def main():
+        batcher = PatientSearchBatcher(ShortResponseClient(), "patients")
+        return await asyncio.wait_for(asyncio.gather(
+            batcher.search({"name": "a"}),
+            batcher.search({"name": "b"}),
+            return_exceptions=True,
+        ), timeout=1)
+
+    first, second = asyncio.run(main())
+    assert first == {"hits": {"hits": []}, "status": 200}
+    assert isinstance(second, RuntimeError)
+
+
+def test_batcher_keeps_in_flight_sends_referenced():
+    class SlowClient(FakeAsyncElasticsearch):
+        async def msearch(self, searches):
+            await self.release.wait()
+            return await super().msearch(searches)
+
+    async def main():
+        client = SlowClient()
+        client.release = asyncio.Event()
+        batcher = PatientSearchBatcher(client, "patients")
+        search = asyncio.create_task(batcher.search({"name": "a"}))
+        await asyncio.sleep(mcp_server.MSEARCH_WINDOW * 2)
+        in_flight = len(batcher.tasks)
+        client.release.set()
+        await search
+        return in_flight, len(batcher.tasks)
+
+    assert asyncio.run(main()) == (1, 0)
+
+
+class FakeServer:
+    """Stands in for the MCP Server so ClinicalMCPServer can register its tools"""
+
+    def __init__(self, name):
+        self.name = name
+
+    def tool(self, name):
+        return lambda fn: fn
+
+
+@pytest.fixture
+def clinical_server(tmp_path, monkeypatch):
+    """ClinicalMCPServer with no Elasticsearch credentials and a small interactions file"""
+    for variable in ("ELASTIC_URL", "ELASTIC_API_KEY", "ELASTIC_INDEX_NAME"):
+        monkeypatch.delenv(variable, raising=False)
+    (tmp_path / "data").mkdir()
+    (tmp_path / "data" / "drug-interactions-data.json").write_text(json.dumps([
+        {"primary_drug": "Diazepam", "negative_drug_interactions": ["Meclizine", "Promethazine"]},
+        {"primary_drug": "Meclizine", "negative_drug_interactions": ["Diazepam"]},
+        {"primary_drug": "Omeprazole", "negative_drug_interactions": ["None"]},
+    ]))
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(mcp_server, "Server", FakeServer)
+    return mcp_server.ClinicalMCPServer()
+
+
+def serve_patient_pages(server, pages, release):
+    """Make the server's record lookup yield the given pages, waiting for release before the last one"""
+    searches = []
+
+    async def iter_patient_record_pages(patient_name):
+        searches.append(patient_name)
+        for page in pages[:-1]:
+            yield page
+        await release.wait()
+        yield pages[-1]
+
+    server.patient_search_batcher = object()  # Only checked for presence; lookups go through the stub above
+    server.iter_patient_record_pages = iter_patient_record_pages
+    return searches
+
+
+def test_stream_patient_data_streams_pages_and_shares_the_fetch(clinical_server):
+    pages = [[{"diagnosis": "BPPV"}], [{"diagnosis": "GERD"}]]
+
+    async def main():
+        release = asyncio.Event()
+        searches = serve_patient_pages(clinical_server, pages, release)
+
+        async def collect(name, aggregate=False):
+            return [chunk async for chunk in clinical_server.stream_patient_data(name, aggregate)]
+
+        leader = asyncio.create_task(collect("Jane Doe"))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(collect("jane doe ", aggregate=True))
+        await asyncio.sleep(0)
+        release.set()
+        return searches, await leader, await follower
+
+    searches, leader, follower = asyncio.run(main())
+    assert searches == ["Jane Doe"]
+    assert [chunk["status"] for chunk in leader] == ["searching", "querying", "partial", "partial", "complete"]
+    assert [chunk["status"] for chunk in follower] == ["searching", "complete"]
+    # The leader already streamed every record in partial chunks; only an aggregate request gets them again
+    assert "records" not in leader[-1]["data"]
+    assert leader[-1]["data"]["total_records"] == 2
+    assert follower[-1]["data"]["records"] == pages[0] + pages[1]
+    assert clinical_server.patient_fetches == {}
+
+
+def test_abandoned_stream_does_not_block_other_requests(clinical_server):
+    pages = [[{"diagnosis": "BPPV"}], [{"diagnosis": "GERD"}]]
+
+    async def main():
+        release = asyncio.Event()
+        serve_patient_pages(clinical_server, pages, release)
+
+        # A client reads the first page and stops reading, leaving its stream suspended mid-fetch
+        stream = clinical_server.stream_patient_data("Jane Doe")
+        async for chunk in stream:
+            if chunk["status"] == "partial":
+                break
+
+        release.set()
+        data = await asyncio.wait_for(clinical_server.fetch_patient_data("Jane Doe"), timeout=1)
+        await stream.aclose()
+        return data
+
+    data = asyncio.run(main())
+    assert data["total_records"] == 2
+
+
+def check_interactions(server, new_medications, existing_medications):
+    async def main():
+        return [chunk async for chunk in server.stream_drug_interaction_check(new_medications, existing_medications)][-1]
+
+    return asyncio.run(main())
+
+
+def test_interactions_are_indexed_both_ways_and_counted_as_pairs(clinical_server):
+    assert set(clinical_server.interaction_pairs) == {
+        frozenset(("Diazepam", "Meclizine")),
+        frozenset(("Diazepam", "Promethazine")),
+    }
+    assert "Diazepam" in clinical_server.drug_interactions["Promethazine"]
+    assert "None" not in clinical_server.drug_interactions
+
+
+def test_interaction_check_finds_reverse_pairs(clinical_server):
+    result = check_interactions(clinical_server, ["Promethazine"], ["Diazepam"])
+    assert result["status"] == "interactions_found"
+    assert result["data"] == ["⚠️ INTERACTION: Potential interaction between Diazepam and Promethazine."]
+
+
+def test_interaction_check_reports_each_pair_once(clinical_server):
+    result = check_interactions(clinical_server, ["Diazepam", "Meclizine"], ["Meclizine", "Diazepam"])
+    assert result["data"] == ["⚠️ INTERACTION: Potential interaction between Diazepam and Meclizine."]
+    assert result["message"] == "Found 1 potential interactions"
+
+
+def test_interaction_check_without_matches_is_safe(clinical_server):
+    assert check_interactions(clinical_server, ["Omeprazole"], ["Diazepam"])["status"] == "safe"
+
+
+def visit(date_of_visit, diagnosis, drugs=("None",)):
+    return {"date_of_visit": date_of_visit, "diagnosis": diagnosis, "drugs_prescribed": list(drugs)}
+
+
+def test_build_digest_sees_changes_to_the_record_list(clinical_server):
+    records = [visit("2024-01-01", "Flu", ["Oseltamivir"])]
+    clinical_server.build_digest(records)
+    records.append(visit("2024-02-01", "Flu", ["Oseltamivir"]))
+
+    digest = clinical_server.build_digest(records)
+    assert digest.diagnosis_counts == {"Flu": 2}
+    assert digest.medication_counts == {"Oseltamivir": 2}
+
+
+def test_get_digest_reuses_only_the_cached_patient_entry(clinical_server):
+    cached = {"success": True, "patient_name": "Jane Doe", "total_records": 1,
+              "records": [visit("2024-01-01", "Flu")]}
+    clinical_server.patient_cache["jane doe"] = cached
+    assert clinical_server.get_digest(cached) is clinical_server.get_digest(cached)
+
+    # The same data supplied by a caller, as summarize_patient_data receives it, gets a digest of its own
+    supplied = json.loads(json.dumps(cached))
+    assert clinical_server.get_digest(supplied) is not clinical_server.get_digest(supplied)
+    assert list(clinical_server.digest_cache) == ["jane doe"]
+
+
+def test_visit_frequency_counts_visits_per_year(clinical_server):
+    records = [visit("2023-01-01", "Flu"), visit("2023-07-02", "Flu"), visit("2024-01-01", "Flu")]
+    assert clinical_server.calculate_visit_frequency(clinical_server.build_digest(records)) == "3.0 visits per year"
+
+    single = [visit("2023-01-01", "Flu")]
+    assert clinical_server.calculate_visit_frequency(clinical_server.build_digest(single)) == "Insufficient data"
+
+
+def test_trending_conditions_need_more_than_a_fifty_percent_rise(clinical_server):
+    # Five visits: the two newest are the recent half, the three oldest the older half.
+    # Cough is 1/2 recent vs 1/3 older, exactly a 50% rise; Flu is 1/2 recent vs 2/3 older, falling.
+    records = [
+        visit("2024-01-01", "Flu"),
+        visit("2024-02-01", "Flu"),
+        visit("2024-03-01", "Cough"),
+        visit("2024-04-01", "Flu"),
+        visit("2024-05-01", "Cough"),
+    ]
+    assert clinical_server.identify_trending_conditions(clinical_server.build_digest(records)) == []
+
+    # One more Cough visit makes it 2/3 recent vs 1/3 older
+    rising = records + [visit("2024-06-01", "Cough")]
+    assert clinical_server.identify_trending_conditions(clinical_server.build_digest(rising)) == ["Cough"]
+
+
+def test_trending_conditions_compare_recent_and_older_halves(clinical_server):
+    # Out of date order on purpose; the halves are taken from the newest-first view
+    records = [
+        visit("2024-06-01", "Migraine"),
+        visit("2024-01-01", "Asthma"),
+        visit("2024-05-01", "Flu"),
+        visit("2024-03-01", "Asthma"),
+        visit("2024-02-01", "Flu"),
+        visit("2024-04-01", "Migraine"),
+    ]
+    digest = clinical_server.build_digest(records)
+
+    # Recent half: Jun, May, Apr. Migraine is 2/3 recent vs 0/3 older, Flu an even 1/3 vs 1/3,
+    # and Asthma only appears in the older half
+    assert clinical_server.identify_trending_conditions(digest) == ["Migraine"]
+    assert clinical_server.get_diagnosis_positions(digest) == {"Migraine": [0, 2], "Flu": [1, 4], "Asthma": [3, 5]}
+
+
+def test_visit_dates_skip_malformed_and_impossible_dates(clinical_server):
+    records = [
+        visit("2023-01-01", "Flu"),
+        visit("3-DAYS-AGO", "Flu"),
+        visit("2023-02-30", "Flu"),
+        visit(None, "Flu"),
+        visit("2024-01-01", "Flu"),
+    ]
+    digest = clinical_server.build_digest(records)
+
+    assert [str(visit_date) for visit_date in clinical_server.get_visit_dates(digest)] == ["2023-01-01", "2024-01-01"]
+    assert clinical_server.calculate_visit_frequency(digest) == "2.0 visits per year"
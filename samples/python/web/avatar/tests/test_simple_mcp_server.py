@@ -0,0 +1,163 @@
+import pytest
+
+import simple_mcp_server
+
+
+def filter_paths(value, paths):
+    """Keep only the given key paths, dropping objects and array entries left empty, like Elasticsearch's filter_path"""
+    if isinstance(value, list):
+        kept = [filter_paths(item, paths) for item in value]
+        return [item for item in kept if item not in (None, {}, [])]
+    if not isinstance(value, dict):
+        return None
+    filtered = {}
+    for key, child in value.items():
+        rest = [path[1:] for path in paths if path[0] == key]
+        if any(not path for path in rest):
+            filtered[key] = child
+        elif rest:
+            child = filter_paths(child, rest)
+            if child not in (None, {}, []):
+                filtered[key] = child
+    return filtered
+
+
+class FakeElasticsearch:
+    """Sync client stub answering msearch from canned hits per patient name, honouring filter_path"""
+
+    def __init__(self):
+        self.hits_by_name = {}
+        self.msearch_calls = 0
+
+    def ping(self):
+        return True
+
+    def msearch(self, searches, filter_path=None):
+        self.msearch_calls += 1
+        responses = []
+        for body in searches[1::2]:
+            name = body["query"]["match"]["patient_name"]
+            if name == "Broken":
+                responses.append({"error": {"type": "search_phase_execution_exception"}, "status": 400})
+                continue
+            hits = self.hits_by_name.get(name, [])
+            responses.append({
+                "took": 1,
+                "status": 200,
+                "hits": {"total": {"value": len(hits), "relation": "eq"}, "hits": [
+                    {"_index": "patients", "_id": str(i), "_score": None, "_source": source}
+                    for i, source in enumerate(hits)
+                ]},
+            })
+        response = {"took": 2, "responses": responses}
+        if filter_path:
+            response = filter_paths(response, [path.split(".") for path in filter_path])
+        return response
+
+
+@pytest.fixture
+def elastic_client(monkeypatch):
+    client = FakeElasticsearch()
+    client.hits_by_name["Jane Doe"] = [
+        {"patient_name": "Jane Doe", "date_of_visit": "2024-03-01", "diagnosis": "GERD", "drugs_prescribed": ["Omeprazole"]},
+        {"patient_name": "Jane Doe", "date_of_visit": "2024-01-15", "diagnosis": "BPPV", "drugs_prescribed": ["None"]},
+    ]
+    monkeypatch.setenv("ELASTIC_URL", "https://elastic.example")
+    monkeypatch.setenv("ELASTIC_API_KEY", "key")
+    monkeypatch.setenv("ELASTIC_INDEX_NAME", "patients")
+    monkeypatch.setattr(simple_mcp_server, "Elasticsearch", lambda **kwargs: client)
+    return client
+
+
+@pytest.fixture
+def server(elastic_client):
+    server = simple_mcp_server.SimpleClinicalServer()
+    server.drug_interactions = {"diazepam": {"meclizine"}, "meclizine": {"diazepam"}}
+    return server
+
+
+def test_unknown_patient_has_no_records(server):
+    result = server.get_patient_data("Nobody Here")
+    assert result == {"success": True, "patient_name": "Nobody Here", "total_records": 0, "records": []}
+
+
+def test_batch_keeps_records_with_their_patient(server):
+    nobody, jane = server.get_patient_data_batch(["Nobody", "Jane Doe"])
+    assert nobody["total_records"] == 0
+    assert jane["patient_name"] == "Jane Doe"
+    assert [record["diagnosis"] for record in jane["records"]] == ["GERD", "BPPV"]
+
+
+def test_batch_reports_a_failed_search_for_its_patient_only(server):
+    broken, jane = server.get_patient_data_batch(["Broken", "Jane Doe"])
+    assert "error" in broken
+    assert jane["total_records"] == 2
+
+
+def test_batch_reports_short_msearch_responses_as_errors(server, elastic_client):
+    elastic_client.msearch = lambda searches, filter_path=None: {"responses": []}
+    assert all("error" in result for result in server.get_patient_data_batch(["Jane Doe", "Nobody"]))
+
+
+def test_repeated_lookups_are_served_from_the_cache(server, elastic_client):
+    first = server.get_patient_data("Jane Doe")
+    again, = server.get_patient_data_batch(["jane doe "])
+    assert again is first
+    assert elastic_client.msearch_calls == 1
+
+
+def test_failed_lookups_are_not_cached(server, elastic_client):
+    server.get_patient_data("Broken")
+    server.get_patient_data("Broken")
+    assert elastic_client.msearch_calls == 2
+
+
+CALLER_SUPPLIED_DATA = {
+    "success": True,
+    "patient_name": "Jane Doe",
+    "total_records": 3,
+    "records": [
+        {"date_of_visit": "2024-01-15", "diagnosis": "BPPV", "drugs_prescribed": ["Meclizine"]},
+        {"date_of_visit": "2024-03-01", "diagnosis": "GERD", "drugs_prescribed": ["None"]},
+        {"date_of_visit": "2024-02-10", "diagnosis": "BPPV", "drugs_prescribed": ["Diazepam", "Meclizine"]},
+    ],
+}
+
+
+def test_aggregate_records_counts_in_one_pass_and_skips_none(server):
+    diagnosis_counts, medication_counts = server.aggregate_records(CALLER_SUPPLIED_DATA["records"])
+    assert diagnosis_counts == {"BPPV": 2, "GERD": 1}
+    assert medication_counts == {"Meclizine": 2, "Diazepam": 1}
+
+
+def test_medication_summary_ignores_none_placeholders(server):
+    summary = server.create_patient_summary(CALLER_SUPPLIED_DATA, "medication_focus")
+    assert summary["current_medications"] == ["Diazepam", "Meclizine"]
+    assert summary["medication_history"]["total_unique_medications"] == 2
+    assert summary["interaction_risks"] == [
+        "Potential interaction: Diazepam + Meclizine",
+        "Potential interaction: Meclizine + Diazepam",
+    ]
+
+
+def test_comprehensive_summary_of_caller_supplied_data(server):
+    summary = server.create_patient_summary(CALLER_SUPPLIED_DATA)
+    assert summary["patient_overview"]["primary_conditions"] == ["BPPV", "GERD"]
+    assert summary["clinical_patterns"] == ["Recurring BPPV (2 occurrences)"]
+    assert [visit["date_of_visit"] for visit in summary["recent_visits"]] == ["2024-03-01", "2024-02-10", "2024-01-15"]
+    # Caller-supplied dicts are never reused, so their summaries aren't cached
+    assert server.create_patient_summary(CALLER_SUPPLIED_DATA) is not summary
+    assert len(server.summary_cache) == 0
+
+
+def test_summaries_of_cached_patient_data_are_built_once(server):
+    patient_data = server.get_patient_data("Jane Doe")
+    summary = server.create_patient_summary(patient_data)
+    assert server.create_patient_summary(server.get_patient_data("jane doe")) is summary
+    assert server.create_patient_summary(patient_data, "medication_focus") is not summary
+
+
+def test_interaction_check_ignores_case_and_keeps_caller_spelling(server):
+    assert server.check_medication_interactions(["DIAZEPAM", "Aspirin"], ["meclizine", "Omeprazole"]) == [
+        "⚠️ INTERACTION: Potential interaction between DIAZEPAM and meclizine."
+    ]